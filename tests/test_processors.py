@@ -0,0 +1,40 @@
+from typing import Any
+
+import pytest
+
+from vr_to_joystick.controller_mapping import ControllerMapping
+from vr_to_joystick.fake_vr_system import FakeVrSystem, seated_rig, simulated_time, synthetic_session
+from vr_to_joystick.mappings.standard_controller import StandardController
+from vr_to_joystick.mappings.throttle_mapping import ThrottleMapping
+from vr_to_joystick.mappings.wheel_mapping import WheelMapping
+from vr_to_joystick.processors import PROCESSORS
+
+MAPPINGS = [WheelMapping, ThrottleMapping, StandardController]
+TICKS = 1500
+TICK_SECONDS = 1 / 90
+
+
+# Replays the synthetic session through a mapping, returning the mapped axis and button values after every tick and
+# the haptic pulses sent over the whole run. Nodes timing gestures on the wall clock, like multi-clicks, read the
+# session's simulated clock instead, so a replay doesn't depend on how fast the machine runs it.
+def replay(
+        mapping_class: type[ControllerMapping], processor: Any,
+        seed: int = 0) -> tuple[list[tuple[Any, ...]], list[tuple[int, int, int]]]:
+    vr_system = FakeVrSystem(seated_rig(), synthetic_session(seed))
+    mapping = mapping_class(vr_system, None, processor)
+
+    values = []
+    with simulated_time(vr_system, TICK_SECONDS):
+        for _ in range(TICKS):
+            vr_system.advance()
+            mapping.tick()
+            values.append((tuple(mapping.value_store.axes), bytes(mapping.value_store.buttons)))
+
+    return values, vr_system.haptic_pulses
+
+
+# every processor has to reproduce the serial processor's outputs exactly, whatever it skips or reorders
+@pytest.mark.parametrize('processor', [name for name in PROCESSORS if name != 'serial'])
+@pytest.mark.parametrize('mapping_class', MAPPINGS)
+def test_processor_matches_serial(mapping_class: type[ControllerMapping], processor: str) -> None:
+    assert replay(mapping_class, processor) == replay(mapping_class, 'serial')
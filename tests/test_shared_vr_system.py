@@ -0,0 +1,59 @@
+import multiprocessing
+import sys
+import threading
+import time
+from typing import Any
+
+from vr_to_joystick.fake_vr_system import FakeVrSystem, seated_rig
+from vr_to_joystick.shared_vr_system import HAPTIC_PULSE_CAPACITY, SharedMemoryVrSystem, VrPoller
+
+THREADS = 4
+# as many pulses as the ring holds, so none are overwritten before the poller reads them
+PULSES_PER_THREAD = HAPTIC_PULSE_CAPACITY // THREADS
+
+
+# polls in a process of its own, as bin/poll does, until told to stop, then reports which devices were pulsed
+def poll(name: str, stop: Any, results: Any) -> None:
+    poller = VrPoller(FakeVrSystem(seated_rig()), name)
+    try:
+        while not stop.is_set():
+            poller.poll()
+            time.sleep(0.001)
+        poller.poll()
+        results.put(sorted(device_index for device_index, _, _ in poller.vr_system.haptic_pulses))
+    finally:
+        poller.close()
+
+
+# Nodes can trigger haptic pulses from several threads at once under ParallelProcessor. Writes racing each other
+# mostly only show up on free-threaded builds, though the switch interval is turned right down to give them a chance.
+def test_haptic_pulses_from_several_threads_all_arrive() -> None:
+    context = multiprocessing.get_context('fork')
+    name = f"vr_to_joystick_test_{time.monotonic_ns()}"
+    stop = context.Event()
+    results = context.Queue()
+    poller = context.Process(target=poll, args=(name, stop, results))
+    poller.start()
+    vr_system = SharedMemoryVrSystem(name)
+    started = threading.Barrier(THREADS)
+
+    def trigger_pulses(device_index: int) -> None:
+        started.wait()
+        for _ in range(PULSES_PER_THREAD):
+            vr_system.triggerHapticPulse(device_index, 0, 1000)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=trigger_pulses, args=[index]) for index in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+        stop.set()
+
+    assert results.get(timeout=5) == [index for index in range(THREADS) for _ in range(PULSES_PER_THREAD)]
+    poller.join()
+    vr_system.close()
@@ -0,0 +1,79 @@
+import math
+
+import openvr
+import pytest
+
+from vr_to_joystick.fake_vr_system import FakeVrSystem, pose_matrix, seated_rig
+from vr_to_joystick.mappings.wheel_mapping import WheelMapping
+from vr_to_joystick.outputs.backend import AXIS_RZ
+
+HMD, LEFT_HAND, RIGHT_HAND = 0, 1, 2
+HAND_SPACING = 0.2  # meters from the center of the wheel to each hand
+
+
+# The steering axis's value with the hands on a wheel turned wheel_degrees and the head at the given angles, turning
+# at head_yaw_rate radians per second, with poses predicted prediction seconds ahead
+def steering(
+        wheel_degrees: float, head_yaw_degrees: float = 0.0, head_roll_degrees: float = 0.0,
+        prediction: float = 0.0, head_yaw_rate: float = 0.0) -> float:
+    vr_system = FakeVrSystem(seated_rig())
+    mapping = WheelMapping(vr_system, None, prediction=prediction)
+    wheel_angle = math.radians(wheel_degrees)
+    dx, dy = HAND_SPACING * math.cos(wheel_angle), HAND_SPACING * math.sin(wheel_angle)
+    vr_system.devices[LEFT_HAND].pose = pose_matrix(0, 0, 0, (-dx, 1.0 - dy, -0.4))
+    vr_system.devices[RIGHT_HAND].pose = pose_matrix(0, 0, 0, (dx, 1.0 + dy, -0.4))
+    vr_system.devices[HMD].pose = pose_matrix(
+        math.radians(head_yaw_degrees), 0, math.radians(head_roll_degrees), (0, 1.2, 0))
+    vr_system.devices[HMD].angular_velocity = [0.0, head_yaw_rate, 0.0]
+    mapping.tick()
+
+    return mapping.value_store.axes[mapping.value_store.axis_slots[mapping.axis_mapping[AXIS_RZ]]]
+
+
+# steering reads a quarter turn as a full deflection from the 0.5 center
+def steering_for(wheel_degrees: float) -> float:
+    return 0.5 + wheel_degrees / 90
+
+
+@pytest.mark.parametrize('head_yaw_degrees', [0, 30, 60, 80, -80])
+def test_steering_ignores_head_yaw(head_yaw_degrees: float) -> None:
+    assert steering(10, head_yaw_degrees) == pytest.approx(steering_for(10))
+
+
+def test_steering_subtracts_head_roll() -> None:
+    assert steering(10, head_roll_degrees=10) == pytest.approx(steering_for(0))
+
+
+# with prediction, the hands are read where they're predicted to be, but turning the head still mustn't steer
+def test_predicted_steering_ignores_head_yaw() -> None:
+    assert steering(10, 45, prediction=0.05, head_yaw_rate=10) == pytest.approx(steering_for(10))
+
+
+# Whether a hand's grip gesture is active after pressing its grip, moving it gesture_distance meters down, then
+# forward_distance meters along z, with the head turned head_yaw_degrees. The left hand's is the handbrake, the
+# first button, and the right hand's the push down then forward gesture, the last.
+def gesture_fires(hand: int, forward_distance: float, head_yaw_degrees: float, gesture_distance: float = 0.1) -> bool:
+    vr_system = FakeVrSystem(seated_rig())
+    mapping = WheelMapping(vr_system, None)
+    button_id = 1 if hand == LEFT_HAND else len(mapping.button_mapping)
+    x = -HAND_SPACING if hand == LEFT_HAND else HAND_SPACING
+    vr_system.devices[HMD].pose = pose_matrix(math.radians(head_yaw_degrees), 0, 0, (0, 1.2, 0))
+    for y, z in [(1.0, -0.4), (1.0 - gesture_distance, -0.4), (1.0 - gesture_distance, -0.4 + forward_distance)]:
+        vr_system.devices[hand].pose = pose_matrix(0, 0, 0, (x, y, z))
+        vr_system.press(hand, openvr.k_EButton_Grip)
+        mapping.tick()
+
+    return bool(mapping.value_store.buttons[mapping.value_store.button_slots[mapping.button_mapping[button_id]]] & 1)
+
+
+# pulling back for the handbrake, or pushing forward, mustn't turn sideways when the head turns to check a mirror
+@pytest.mark.parametrize('head_yaw_degrees', [0, 60, -80])
+def test_handbrake_ignores_head_yaw(head_yaw_degrees: float) -> None:
+    assert gesture_fires(LEFT_HAND, 0.1, head_yaw_degrees)
+    assert not gesture_fires(LEFT_HAND, 0.0, head_yaw_degrees)
+
+
+@pytest.mark.parametrize('head_yaw_degrees', [0, 60, -80])
+def test_push_down_then_forward_ignores_head_yaw(head_yaw_degrees: float) -> None:
+    assert gesture_fires(RIGHT_HAND, -0.1, head_yaw_degrees)
+    assert not gesture_fires(RIGHT_HAND, 0.0, head_yaw_degrees)
@@ -0,0 +1,128 @@
+import ctypes
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+import openvr
+
+from vr_to_joystick.nodes.vr_system_state import VrSystemState
+
+FLOAT_SIZE = 4
+POSE_FLOATS = ctypes.sizeof(openvr.TrackedDevicePose_t) // FLOAT_SIZE
+# where the values checked for motion are in a device's pose, counted in floats: its velocity, its angular velocity,
+# then the translation column of its pose matrix
+MOTION_OFFSETS = np.array([
+    *(openvr.TrackedDevicePose_t.vVelocity.offset // FLOAT_SIZE + axis for axis in range(3)),
+    *(openvr.TrackedDevicePose_t.vAngularVelocity.offset // FLOAT_SIZE + axis for axis in range(3)),
+    *(openvr.TrackedDevicePose_t.mDeviceToAbsoluteTracking.offset // FLOAT_SIZE + row * 4 + 3 for row in range(3)),
+], dtype=np.intp)
+
+
+def _no_floats() -> npt.NDArray[np.float32]:
+    return np.zeros(0, dtype=np.float32)
+
+
+# Decides whether anything a mapping reads is changing: the devices it follows moving, buttons being held or changing
+# state, or analog axes moving. It's checked after every tick, and between ticks by sampling the VR system's inputs
+# first, so a runner can tick less often while the controllers are put down and wake up as soon as they're picked up.
+@dataclass
+class ActivityMonitor:
+    vr_system_state: VrSystemState
+    # speeds under these along every axis count as resting, in m/s and rad/s
+    velocity_threshold: float = 0.02
+    angular_velocity_threshold: float = 0.1
+    # how far a device can drift along any axis, in meters, from where it last moved before that counts as moving too,
+    # which catches movement too slow to go over the velocity threshold
+    translation_threshold: float = 0.005
+    # how far an analog axis (a trigger, thumbstick or touchpad, from -1 to 1) can drift from where it last moved
+    analog_threshold: float = 0.01
+    # The polled slots the arrays below were set up for, which are replaced with a new list whenever they or the
+    # device behind a slot change. Motion is checked by gathering MOTION_OFFSETS for every watched device from the
+    # pose buffer into one array, taking away where each device was when it last moved (with zeros against the
+    # velocities), and comparing the lot against a matching array of thresholds.
+    watched_for: Optional[list[int]] = field(default=None, init=False)
+    pose_floats: npt.NDArray[np.float32] = field(default_factory=_no_floats, init=False)
+    motion_indexes: npt.NDArray[np.intp] = field(default_factory=lambda: np.zeros(0, dtype=np.intp), init=False)
+    motion_thresholds: npt.NDArray[np.float32] = field(default_factory=_no_floats, init=False)
+    translation_mask: npt.NDArray[np.float32] = field(default_factory=_no_floats, init=False)
+    motion: npt.NDArray[np.float32] = field(default_factory=_no_floats, init=False)
+    motion_change: npt.NDArray[np.float32] = field(default_factory=_no_floats, init=False)
+    # what the last check saw, or where devices and axes were when they last moved
+    rest_motion: npt.NDArray[np.float32] = field(default_factory=_no_floats, init=False)
+    buttons_pressed: list[int] = field(default_factory=list, init=False)
+    buttons_touched: list[int] = field(default_factory=list, init=False)
+    rest_axes: npt.NDArray[np.float32] = field(default_factory=_no_floats, init=False)
+
+    # whether anything changed as of the last tick
+    def is_active(self) -> bool:
+        # every check runs, since each one also moves its reference point along
+        moving = self._devices_moving()
+        buttons_changing = self._buttons_changing()
+        axes_moving = self._axes_moving()
+        return moving or buttons_changing or axes_moving
+
+    # fetches fresh inputs without running a tick, then checks them
+    def probe(self) -> bool:
+        self.vr_system_state.sample_inputs()
+        return self.is_active()
+
+    # watches the devices the mapping follows, as well as any it reads controller state from
+    def _devices_moving(self) -> bool:
+        state = self.vr_system_state
+        if state.polled_device_indexes is not self.watched_for:
+            self._watch_devices()
+            # a device may have moved to another index, so there's nothing to compare against yet
+            return True
+
+        np.take(self.pose_floats, self.motion_indexes, out=self.motion)
+        np.subtract(self.motion, self.rest_motion, out=self.motion_change)
+        np.abs(self.motion_change, out=self.motion_change)
+        moving = bool(np.greater(self.motion_change, self.motion_thresholds).any())
+        if moving:
+            np.multiply(self.motion, self.translation_mask, out=self.rest_motion)
+        return moving
+
+    def _watch_devices(self) -> None:
+        state = self.vr_system_state
+        self.watched_for = state.polled_device_indexes
+        self.pose_floats = np.frombuffer(state.pose_buffer, dtype=np.float32)
+        device_indexes = np.array([
+            state.device_slots[slot] for slot in sorted(state.tracked_devices.keys() | self.watched_for)
+        ], dtype=np.intp)
+        self.motion_indexes = (device_indexes[:, np.newaxis] * POSE_FLOATS + MOTION_OFFSETS).ravel()
+        self.motion_thresholds = np.tile(np.array([
+            *[self.velocity_threshold] * 3, *[self.angular_velocity_threshold] * 3, *[self.translation_threshold] * 3,
+        ], dtype=np.float32), len(device_indexes))
+        self.translation_mask = np.tile(np.array([0] * 6 + [1] * 3, dtype=np.float32), len(device_indexes))
+        self.motion = self.pose_floats[self.motion_indexes]
+        self.motion_change = np.zeros_like(self.motion)
+        self.rest_motion = self.motion * self.translation_mask
+
+    # a held button counts as activity even if it's unchanged, since nodes can act on how long a button is held
+    def _buttons_changing(self) -> bool:
+        state = self.vr_system_state
+        buttons_pressed = [state.buttons_pressed[slot] for slot in state.polled_device_indexes]
+        buttons_touched = [state.buttons_touched[slot] for slot in state.polled_device_indexes]
+        changed = buttons_pressed != self.buttons_pressed or buttons_touched != self.buttons_touched
+        self.buttons_pressed = buttons_pressed
+        self.buttons_touched = buttons_touched
+
+        return (
+            changed
+            or any(buttons_pressed)
+            or bool(state.pending_button_transitions)
+            or bool(state.button_transitions)
+        )
+
+    # every axis of every polled controller, read as one block of floats rather than field by field
+    def _axes_moving(self) -> bool:
+        axes = np.frombuffer(b''.join([
+            bytes(controller_state.rAxis) for controller_state in self.vr_system_state.controller_states.values()
+        ]), dtype=np.float32)
+        moving = axes.shape != self.rest_axes.shape or bool(
+            len(axes) and np.abs(axes - self.rest_axes).max() > self.analog_threshold
+        )
+        if moving:
+            self.rest_axes = axes
+        return moving
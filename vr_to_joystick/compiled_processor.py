@@ -0,0 +1,142 @@
+from dataclasses import dataclass, field
+import math
+from typing import Any, Callable, Iterable, Optional
+
+from vr_to_joystick.graph import ScheduleStep
+from vr_to_joystick.nodes.types import BUTTON_STATES, TICK_STATE_CODES, BaseButton
+from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+from vr_to_joystick.scheduled_processor import ScheduledProcessor
+from vr_to_joystick.value_store import ValueStore
+
+Kernel = Callable[[bool], None]
+
+
+# Generates the source of a single function that evaluates the whole schedule. Node values live in locals, nodes
+# that provide a kernel expression are inlined with their configuration baked in as literals, and inlined buttons
+# keep their previous state in a flat bytearray rather than on the node. Anything else is called through its
+# generate_output (or update_with_inputs, for pure consumers), and exported values are written back to the node so
+# code outside the kernel can keep reading current_value. Given a lazy schedule, branches of inlined switches become
+# if blocks, skipped unless selected or the kernel is called with every_branch set. Nodes with a slot in the value
+# store are written straight into its buffers.
+def generate_kernel_source(
+        schedule: list[ValueConsumer],
+        exported_nodes: Optional[Iterable[ValueConsumer]] = None,
+        steps: Optional[list[ScheduleStep]] = None,
+        value_store: Optional[ValueStore] = None) -> tuple[str, bytearray]:
+    exported = None if exported_nodes is None else set(exported_nodes)
+    positions = {node: position for position, node in enumerate(schedule)}
+    button_states = bytearray()
+    value_names: dict[ValueConsumer, str] = {}
+    node_references: list[str] = []
+
+    def emit_steps(steps: list[ScheduleStep], body: list[str]) -> None:
+        for step in steps:
+            emit_step(step, body)
+
+    def emit_step(step: ScheduleStep, body: list[str]) -> None:
+        node = step.node
+        position = positions[node]
+        value_name = f"v{position}"
+        node_name = f"n{position}"
+        # branches are only conditional if the node is inlined too, since calling into the node would need a value
+        # for every input, including the unselected ones. Everything but the branches has a value by now.
+        placeholders = {key: key for key in node.dependencies}
+        inlined = (
+            (isinstance(node, BaseButton) and node.kernel_state_expression(placeholders) is not None)
+            or (isinstance(node, ValueGenerator) and node.kernel_expression(placeholders) is not None)
+        )
+        selector_inputs = {
+            key: value_names[dependency]
+            for key, dependency in node.dependencies.items()
+            if key not in node.branch_dependencies
+        }
+        for key, branch in step.branches.items():
+            if not branch:
+                continue
+            condition = node.branch_condition(key, selector_inputs) if inlined else None
+            if condition is None:
+                emit_steps(branch, body)
+                continue
+            branch_body: list[str] = []
+            emit_steps(branch, branch_body)
+            body.append(f"if every_branch or {condition}:")
+            body.extend(f"    {line}" for line in branch_body)
+
+        value_names[node] = value_name
+        inputs = {key: value_names[dependency] for key, dependency in node.dependencies.items()}
+        body.append(f"# {node.__class__.__name__}{node.__config_params_str__()}")
+
+        inlined = True
+        if isinstance(node, BaseButton) and (state_expression := node.kernel_state_expression(inputs)) is not None:
+            slot = len(button_states)
+            button_states.append(1 if node.state else 0)
+            body.append(f"code = button_states[{slot}] * 2 + (1 if {state_expression} else 0)")
+            body.append(f"{value_name} = BUTTON_STATES[code]")
+            body.append(f"button_states[{slot}] = code & 1")
+        elif isinstance(node, ValueGenerator) and (expression := node.kernel_expression(inputs)) is not None:
+            body.append(f"{value_name} = {expression}")
+        else:
+            inlined = False
+            node_references.append(f"{node_name} = nodes[{position}]")
+            inputs_dict = f"{{{', '.join(f'{key!r}: {name}' for key, name in inputs.items())}}}"
+            if isinstance(node, ValueGenerator):
+                body.append(f"{value_name} = {node_name}.generate_output({inputs_dict})")
+            else:
+                body.append(f"{node_name}.update_with_inputs({inputs_dict})")
+
+        if isinstance(node, ValueGenerator) and (not inlined or exported is None or node in exported):
+            if inlined:
+                node_references.append(f"{node_name} = nodes[{position}]")
+            body.append(f"{node_name}.current_value = {value_name}")
+
+        if value_store is not None and node in value_store.axis_slots:
+            body.append(f"axes[{value_store.axis_slots[node]}] = {value_name}")
+        if value_store is not None and node in value_store.button_slots:
+            button_slot = value_store.button_slots[node]
+            if inlined and isinstance(node, BaseButton):
+                body.append(f"buttons[{button_slot}] = code")
+            else:
+                body.append(f"buttons[{button_slot}] = TICK_STATE_CODES[{value_name}['tick_state']]")
+
+    body: list[str] = []
+    emit_steps(steps if steps is not None else [ScheduleStep(node) for node in schedule], body)
+
+    source = "\n".join([
+        "def build_kernel(nodes, button_states, axes, buttons, BUTTON_STATES, TICK_STATE_CODES, math):",
+        *(f"    {line}" for line in node_references),
+        "",
+        "    def kernel(every_branch=False):",
+        *(f"        {line}" for line in body),
+        "",
+        "    return kernel",
+    ])
+
+    return source, button_states
+
+
+# Runs the graph through a single generated function (see generate_kernel_source) instead of calling into every node.
+# The kernel owns the state of the buttons it inlines, so once it has run, those nodes' own `state` fields go stale.
+@dataclass
+class CompiledProcessor(ScheduledProcessor):
+    kernel: Kernel = field(init=False)
+    kernel_source: str = field(init=False)
+
+    def compile(self) -> None:
+        super().compile()
+
+        self.kernel_source, button_states = generate_kernel_source(
+            self.schedule, self.sinks, self.steps, self.value_store)
+        namespace: dict[str, Any] = {}
+        exec(compile(self.kernel_source, '<compiled mapping kernel>', 'exec'), namespace)
+        self.kernel = namespace['build_kernel'](
+            self.schedule,
+            button_states,
+            None if self.value_store is None else self.value_store.axes,
+            None if self.value_store is None else self.value_store.buttons,
+            BUTTON_STATES,
+            TICK_STATE_CODES,
+            math)
+
+    def process_for_tick(self, tick: int) -> None:
+        self.kernel(not self.evaluated_every_branch)
+        self.evaluated_every_branch = True
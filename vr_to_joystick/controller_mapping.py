@@ -1,15 +1,18 @@
 from abc import abstractmethod
 import logging
 import time
-from typing import Iterable, Iterator
+from typing import Iterable, Iterator, Literal, Optional, Union
 
 import openvr
-from pyvjoy.vjoydevice import VJoyDevice
 
 from vr_to_joystick.nodes.types import Axis, Button
 from vr_to_joystick.nodes.value_generator import ValueConsumer
-from vr_to_joystick.nodes.vr_system_state import ControllerRole, DeviceClass, VrSystemState
-from vr_to_joystick.serial_processor import SerialProcessor
+from vr_to_joystick.nodes.vr_system_state import ButtonSource, ControllerRole, DeviceClass, VrSystemState
+from vr_to_joystick.optimizer import optimize_graph
+from vr_to_joystick.outputs.backend import OutputBackend
+from vr_to_joystick.outputs.worker import OutputWorker
+from vr_to_joystick.processors import PROCESSORS, Processor, ProcessorName
+from vr_to_joystick.value_store import ValueStore
 
 
 logger = logging.getLogger(__name__)
@@ -23,6 +26,11 @@ SUPPORTED_BUTTON_EVENTS = [
 ]
 
 
+# How far ahead predicted poses are predicted: a fixed number of seconds, or 'auto' to follow the measured delay
+# between poses being fetched and outputs being submitted
+PredictionHorizon = Union[float, Literal['auto']]
+
+
 def events(vr_system: openvr.IVRSystem) -> Iterator[openvr.VREvent_t]:
     event = openvr.VREvent_t()
     while vr_system.pollNextEvent(event):
@@ -31,53 +39,127 @@ def events(vr_system: openvr.IVRSystem) -> Iterator[openvr.VREvent_t]:
 
 class ControllerMapping:
     AXIS_PRECISION = 0x8000
-    DEVICE_WAIT_TIMEOUT = 120  # two minutes
-    DEVICE_POLL_TIME = 5       # five seconds
+    DEVICE_WAIT_TIMEOUT = 120       # two minutes
+    DEVICE_EVENT_POLL_TIME = 0.05   # how often to check for devices connecting while waiting for them
+    MAX_PREDICTION_SECONDS = 0.1    # openvr's predictions get unreliable much further ahead than this
+    PREDICTION_SMOOTHING = 0.05     # how much each tick's measured delay moves the running average, with 'auto'
     vr_system: openvr.IVRSystem
-    vjoy_device_id: int
 
     root_node: VrSystemState
-    vjoy_device: VJoyDevice
+    output: Optional[OutputBackend]
+    # the thread outputs are written from, when they're not written from the tick
+    output_worker: Optional[OutputWorker]
     axis_mapping: dict[int, Axis]
     button_mapping: dict[int, Button]
+    value_store: ValueStore
+    # (output ID, value store slot) for each mapped axis and button
+    axis_slots: list[tuple[int, int]]
+    button_slots: list[tuple[int, int]]
+    processor: Processor
+    prediction: PredictionHorizon
+    # seconds outputs take to have an effect once submitted, e.g. for vJoy and the game to pick them up, and for the
+    # game to see them on average given they're held until the next tick. Added to the measured delay with 'auto'.
+    output_latency: float
+    # running average of the seconds between poses being fetched and outputs being submitted
+    output_delay: float
 
     # we can't use a dataclass for this, since dataclasses break for abstract methods
-    def __init__(self, vr_system: openvr.IVRSystem, vjoy_device_id: int):
+    # with no output backend, the mapping runs headless: the graph is evaluated every tick, but nothing is output
+    # with output_thread, outputs and haptic pulses are written to the backend by an OutputWorker's thread
+    def __init__(
+            self,
+            vr_system: openvr.IVRSystem,
+            output: Optional[OutputBackend],
+            processor: ProcessorName = 'compiled',
+            button_source: ButtonSource = 'controller_state',
+            prediction: PredictionHorizon = 0.0,
+            output_latency: float = 0.0,
+            output_thread: bool = False):
+        if prediction != 'auto' and not 0 <= prediction <= self.MAX_PREDICTION_SECONDS:
+            raise ValueError(
+                f"Pose prediction must be 'auto' or between 0 and {self.MAX_PREDICTION_SECONDS} seconds, "
+                f"got {prediction}")
+
         self.vr_system = vr_system
-        self.vjoy_device_id = vjoy_device_id
+        self.output_worker = None
+        if output is not None and output_thread:
+            self.output_worker = OutputWorker(output, vr_system.triggerHapticPulse)
+            output = self.output_worker
+        self.output = output
+        self.prediction = prediction
+        self.output_latency = output_latency
+        self.output_delay = 0.0
 
         logger.info("Binding to VR system...")
-        self.root_node = VrSystemState(self.vr_system)
-        logger.info(f"VR system bound. Claiming target VJoy device {self.vjoy_device_id}...")
-        self.vjoy_device = VJoyDevice(self.vjoy_device_id)
-        logger.info("Claimed. Polling for required controllers...")
+        self.root_node = VrSystemState(self.vr_system, button_source)
+        if self.output_worker is not None:
+            self.root_node.haptic_pulse_sink = self.output_worker.add_haptic_pulse
+        self.root_node.prediction_seconds = min(output_latency, self.MAX_PREDICTION_SECONDS) \
+            if prediction == 'auto' else prediction
+        if self.output is None:
+            logger.info("VR system bound. Running headless, without an output device.")
+        else:
+            logger.info("VR system bound.")
+        logger.info("Polling for required controllers...")
         self.wait_for_required_devices()
         logger.info("All required controllers found.")
         self.axis_mapping = self.generate_axis_mapping(self.root_node)
         self.button_mapping = self.generate_button_mapping(self.root_node)
         self.event_triggers = self.generate_event_triggers(self.root_node)
         self.current_tick = -1
-        self.processor = SerialProcessor(self.root_node)
+        self.optimize_graph()
+        self.value_store = ValueStore.for_nodes(self.axis_mapping.values(), self.button_mapping.values())
+        self.axis_slots = [
+            (axis_id, self.value_store.axis_slots[axis_node]) for axis_id, axis_node in self.axis_mapping.items()
+        ]
+        self.button_slots = [
+            (button_id, self.value_store.button_slots[button_node])
+            for button_id, button_node in self.button_mapping.items()
+        ]
+        # the graph is fully built at this point, so processors can plan their work once here rather than every tick
+        self.processor = PROCESSORS[processor](self.root_node, self.sinks, self.value_store)
+        if self.output is not None:
+            self.output.declare_outputs(self.axis_mapping.keys(), self.button_mapping.keys())
+
+    # every node whose value leaves the graph, either as an output or as a side effect like haptic feedback
+    @property
+    def sinks(self) -> list[ValueConsumer]:
+        return [*self.axis_mapping.values(), *self.button_mapping.values(), *self.event_triggers]
+
+    # rewrites the mapped graph into a simpler but equivalent one, e.g. folding chains of axis scalings into one
+    def optimize_graph(self) -> None:
+        result = optimize_graph(self.sinks)
+        self.axis_mapping = {
+            axis_id: result.replacements.get(axis_node, axis_node)
+            for axis_id, axis_node in self.axis_mapping.items()
+        }
+        self.button_mapping = {
+            button_id: result.replacements.get(button_node, button_node)
+            for button_id, button_node in self.button_mapping.items()
+        }
+        logger.info(f"Simplified mapping graph from {result.nodes_before} to {result.nodes_after} node(s).")
 
     @property
     def required_devices(self) -> Iterable[tuple[DeviceClass, ControllerRole]]:
         raise NotImplementedError("Controller mappings must enumerate the devices they expect to be present.")
 
+    # Devices are only looked up again when openvr reports one being (de)activated or changing role, so this returns
+    # as soon as the event for the last missing device comes in.
     def wait_for_required_devices(self) -> None:
-        time_waited = 0
-        while time_waited < self.DEVICE_WAIT_TIMEOUT:
-            if not (missing_controllers := self.controllers_missing()):
-                return
-
-            missing_list = ", ".join(".".join(controller) for controller in missing_controllers)
-            logger.info(f"Waiting for controller(s): {missing_list}")
-            logger.debug(f"Polling again in {self.DEVICE_POLL_TIME} seconds...")
-            time.sleep(self.DEVICE_POLL_TIME)
-            time_waited += self.DEVICE_POLL_TIME
-            self.root_node.load_devices_by_index()
-
-        raise TimeoutError(
-            f"Waited longer than maximum wait time of {self.DEVICE_WAIT_TIMEOUT} for required controllers. Giving up.")
+        deadline = time.monotonic() + self.DEVICE_WAIT_TIMEOUT
+        reported_missing: list[tuple[DeviceClass, ControllerRole]] = []
+        while missing_controllers := self.controllers_missing():
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Waited longer than maximum wait time of {self.DEVICE_WAIT_TIMEOUT} for required controllers. "
+                    "Giving up.")
+
+            if missing_controllers != reported_missing:
+                missing_list = ", ".join(".".join(controller) for controller in missing_controllers)
+                logger.info(f"Waiting for controller(s): {missing_list}")
+                reported_missing = missing_controllers
+            time.sleep(self.DEVICE_EVENT_POLL_TIME)
+            self.root_node.poll_events()
 
     def controllers_missing(self) -> list[tuple[DeviceClass, ControllerRole]]:
         missing_controllers: list[tuple[DeviceClass, ControllerRole]] = []
@@ -89,7 +171,8 @@ class ControllerMapping:
 
         return missing_controllers
 
-    # a series of nodes stemming from the root node that generate a mapping to vjoy axes
+    # a series of nodes stemming from the root node that generate a mapping to output axes, keyed by the AXIS_* IDs
+    # in vr_to_joystick.outputs.backend
     @abstractmethod
     def generate_axis_mapping(self, root_node: VrSystemState) -> dict[int, Axis]:
         pass
@@ -105,13 +188,31 @@ class ControllerMapping:
         self.current_tick += 1
         self.processor.process_for_tick(self.current_tick)
 
-        self.sync_axes()
-        self.sync_buttons()
-
-    def sync_axes(self) -> None:
-        for axis_id, axis_node in self.axis_mapping.items():
-            self.vjoy_device.set_axis(axis_id, int(axis_node.current_value * self.AXIS_PRECISION))
-
-    def sync_buttons(self) -> None:
-        for button_id, button_node in self.button_mapping.items():
-            self.vjoy_device.set_button(button_id, button_node.current_value['active'])
+        if self.output is not None:
+            self.sync_axes(self.output)
+            self.sync_buttons(self.output)
+            self.output.submit()
+        if self.prediction == 'auto':
+            self.update_prediction()
+
+    # Folds this tick's delay between poses being fetched and outputs being submitted into its running average, and
+    # predicts poses that far ahead plus however long outputs take to have an effect from there
+    def update_prediction(self) -> None:
+        delay = time.perf_counter() - self.root_node.poses_fetched_at
+        if self.current_tick == 0:
+            self.output_delay = delay
+        else:
+            self.output_delay += (delay - self.output_delay) * self.PREDICTION_SMOOTHING
+        self.root_node.prediction_seconds = min(self.output_delay + self.output_latency, self.MAX_PREDICTION_SECONDS)
+
+    # stages this tick's values on the output, which sends them all at once when submitted
+    def sync_axes(self, output: OutputBackend) -> None:
+        axes = self.value_store.axes
+        for axis_id, slot in self.axis_slots:
+            output.set_axis(axis_id, int(axes[slot] * self.AXIS_PRECISION))
+
+    def sync_buttons(self, output: OutputBackend) -> None:
+        buttons = self.value_store.buttons
+        for button_id, slot in self.button_slots:
+            # the low bit of a tick state code is whether the button is active
+            output.set_button(button_id, bool(buttons[slot] & 1))
@@ -0,0 +1,329 @@
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import math
+import random
+import time
+from typing import Any, Callable, Iterator, Optional
+
+import openvr
+
+
+def identity_pose() -> list[list[float]]:
+    return [
+        [1.0, 0.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0, 0.0],
+        [0.0, 0.0, 1.0, 0.0],
+    ]
+
+
+# A device tracked by FakeVrSystem, holding the state its scripts move around each tick.
+@dataclass
+class FakeDevice:
+    device_class: int
+    role: int = openvr.TrackedControllerRole_Invalid
+    # row-major 3x4 device-to-absolute transform, i.e. a rotation matrix with the translation in the last column
+    pose: list[list[float]] = field(default_factory=identity_pose)
+    velocity: list[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
+    angular_velocity: list[float] = field(default_factory=lambda: [0.0, 0.0, 0.0])
+    buttons_pressed: int = 0
+    buttons_touched: int = 0
+    # x/y for each of the controller's five analog axes (touchpad, trigger, thumbstick, ...)
+    axes: list[list[float]] = field(
+        default_factory=lambda: [[0.0, 0.0] for _ in range(openvr.k_unControllerStateAxisCount)])
+
+
+# called once per tick with the fake system and the tick index, to move devices and press buttons
+Script = Callable[['FakeVrSystem', int], None]
+
+
+# Scripted stand-in for openvr.IVRSystem, implementing the subset of its interface this package uses.
+# Lets mappings be built, replayed and profiled without SteamVR or a headset.
+class FakeVrSystem:
+    devices: dict[int, FakeDevice]
+    script: Optional[Script]
+    tick: int
+    # (event type, device index, button id), with a button id of 0 for events that aren't about a button
+    queued_events: deque[tuple[int, int, int]]
+    haptic_pulses: list[tuple[int, int, int]]
+    # calls made to each IVRSystem method, for benchmarks measuring how much polling a tick does
+    calls: Counter[str]
+
+    def __init__(self, devices: dict[int, FakeDevice], script: Optional[Script] = None):
+        self.devices = devices
+        self.script = script
+        self.tick = 0
+        self.queued_events = deque()
+        self.haptic_pulses = []
+        self.calls = Counter()
+
+    # runs the script for the next tick
+    def advance(self) -> None:
+        if self.script is not None:
+            self.script(self, self.tick)
+        self.tick += 1
+
+    def press(self, device_index: int, button_id: int, pressed: bool = True) -> None:
+        device = self.devices[device_index]
+        if bool(device.buttons_pressed >> button_id & 1) == pressed:
+            return
+
+        device.buttons_pressed ^= 1 << button_id
+        event_type = openvr.VREvent_ButtonPress if pressed else openvr.VREvent_ButtonUnpress
+        self.queued_events.append((event_type, device_index, button_id))
+
+    def touch(self, device_index: int, button_id: int, touched: bool = True) -> None:
+        device = self.devices[device_index]
+        if bool(device.buttons_touched >> button_id & 1) == touched:
+            return
+
+        device.buttons_touched ^= 1 << button_id
+        event_type = openvr.VREvent_ButtonTouch if touched else openvr.VREvent_ButtonUntouch
+        self.queued_events.append((event_type, device_index, button_id))
+
+    # plugs a device in at the given index, e.g. a controller coming back under a new index after dropping out
+    def connect(self, device_index: int, device: FakeDevice) -> None:
+        self.devices[device_index] = device
+        self.queued_events.append((openvr.VREvent_TrackedDeviceActivated, device_index, 0))
+
+    def disconnect(self, device_index: int) -> FakeDevice:
+        device = self.devices.pop(device_index)
+        self.queued_events.append((openvr.VREvent_TrackedDeviceDeactivated, device_index, 0))
+
+        return device
+
+    def set_role(self, device_index: int, role: int) -> None:
+        self.devices[device_index].role = role
+        self.queued_events.append((openvr.VREvent_TrackedDeviceRoleChanged, device_index, 0))
+
+    # the IVRSystem interface
+
+    def getTrackedDeviceClass(self, device_index: int) -> int:
+        if device_index not in self.devices:
+            return openvr.TrackedDeviceClass_Invalid  # type: ignore
+
+        return self.devices[device_index].device_class
+
+    def getControllerRoleForTrackedDeviceIndex(self, device_index: int) -> int:
+        if device_index not in self.devices:
+            return openvr.TrackedControllerRole_Invalid  # type: ignore
+
+        return self.devices[device_index].role
+
+    def getDeviceToAbsoluteTrackingPose(self, origin: int, predicted_seconds: float, poses: Any) -> Any:
+        self.calls['getDeviceToAbsoluteTrackingPose'] += 1
+        for device_index, device in self.devices.items():
+            pose = poses[device_index]
+            matrix = device.pose
+            if predicted_seconds:
+                matrix = extrapolate_pose(matrix, device.velocity, device.angular_velocity, predicted_seconds)
+            for row in range(3):
+                for column in range(4):
+                    pose.mDeviceToAbsoluteTracking[row][column] = matrix[row][column]
+            for axis in range(3):
+                pose.vVelocity[axis] = device.velocity[axis]
+                pose.vAngularVelocity[axis] = device.angular_velocity[axis]
+            pose.bPoseIsValid = True
+            pose.bDeviceIsConnected = True
+
+        return poses
+
+    def getControllerState(self, device_index: int) -> tuple[bool, openvr.VRControllerState_t]:
+        self.calls['getControllerState'] += 1
+        controller_state = openvr.VRControllerState_t()
+        if device_index not in self.devices:
+            return False, controller_state
+
+        device = self.devices[device_index]
+        controller_state.unPacketNum = self.tick
+        controller_state.ulButtonPressed = device.buttons_pressed
+        controller_state.ulButtonTouched = device.buttons_touched
+        for axis_index, (x, y) in enumerate(device.axes):
+            controller_state.rAxis[axis_index].x = x
+            controller_state.rAxis[axis_index].y = y
+
+        return True, controller_state
+
+    def pollNextEvent(self, event: openvr.VREvent_t) -> bool:
+        self.calls['pollNextEvent'] += 1
+        if not self.queued_events:
+            return False
+
+        event.eventType, event.trackedDeviceIndex, event.data.controller.button = self.queued_events.popleft()
+        return True
+
+    def triggerHapticPulse(self, device_index: int, axis_id: int, duration_mcs: int) -> None:
+        self.haptic_pulses.append((device_index, axis_id, duration_mcs))
+
+
+# an HMD and a pair of hand controllers, at indexes 0, 1 and 2 respectively
+def seated_rig() -> dict[int, FakeDevice]:
+    return {
+        0: FakeDevice(openvr.TrackedDeviceClass_HMD),
+        1: FakeDevice(openvr.TrackedDeviceClass_Controller, openvr.TrackedControllerRole_LeftHand),
+        2: FakeDevice(openvr.TrackedDeviceClass_Controller, openvr.TrackedControllerRole_RightHand),
+    }
+
+
+SCRIPTED_BUTTONS = [
+    openvr.k_EButton_Grip,
+    openvr.k_EButton_SteamVR_Trigger,
+    openvr.k_EButton_ApplicationMenu,
+    openvr.k_EButton_Axis0,
+    openvr.k_EButton_Axis2,
+]
+
+
+# Deterministic pseudo-random session: every device sways and twists smoothly, analog axes sweep their range,
+# and roughly one tick in ten toggles a button on one of the devices.
+def synthetic_session(seed: int = 0) -> Script:
+    rng = random.Random(seed)
+
+    def script(vr_system: FakeVrSystem, tick: int) -> None:
+        for device_index, device in vr_system.devices.items():
+            phase = tick * 0.05 + device_index
+            yaw, pitch, roll = 0.4 * math.sin(phase * 0.7), 0.5 * math.sin(phase), 0.6 * math.cos(phase * 0.6)
+            device.pose = pose_matrix(yaw, pitch, roll, (
+                0.2 * math.sin(phase * 0.4),
+                1.0 + 0.1 * math.cos(phase * 1.3),
+                -0.3 + 0.1 * math.sin(phase * 0.9),
+            ))
+            device.velocity = [math.sin(phase * 2), 0.5 * math.cos(phase), 0.0]
+            for axis_index, axis in enumerate(device.axes):
+                axis[0] = math.sin(phase * (axis_index + 1))
+                axis[1] = math.cos(phase * (axis_index + 1) * 0.5)
+
+        if rng.random() < 0.1:
+            device_index = rng.choice(list(vr_system.devices))
+            button_id = rng.choice(SCRIPTED_BUTTONS)
+            pressed = not vr_system.devices[device_index].buttons_pressed >> button_id & 1
+            vr_system.touch(device_index, button_id, pressed)
+            vr_system.press(device_index, button_id, pressed)
+
+    return script
+
+
+# The given session, with both hands' grips clicked together three times in quick succession every every_seconds,
+# the gesture the wheel mapping toggles steering on, which it gives a haptic pulse for on each hand. Each press and
+# release is held for click_seconds. Ticks are taken to come rate times a second.
+def grip_clicking_session(
+        session: Script,
+        rate: float,
+        every_seconds: float = 2.0,
+        click_seconds: float = 0.05,
+        clicks: int = 3) -> Script:
+    def script(vr_system: FakeVrSystem, tick: int) -> None:
+        session(vr_system, tick)
+        slot = int(tick / rate % every_seconds / click_seconds)
+        if slot < 2 * clicks:
+            for device_index in (1, 2):
+                vr_system.press(device_index, openvr.k_EButton_Grip, slot % 2 == 0)
+
+    return script
+
+
+# a seated rig running the synthetic session with the grips clicked every so often, built by a function rather than
+# passed around, since scripts can't be pickled over to another process. Ticks are taken to come rate times a second.
+def synthetic_vr_system(seed: int = 0, rate: float = 90) -> FakeVrSystem:
+    return FakeVrSystem(seated_rig(), grip_clicking_session(synthetic_session(seed), rate))
+
+
+# The synthetic session, broken up by stretches of the devices lying still with every button let go, as when the
+# controllers are put down: active_ticks of the session, then rest_ticks of rest, over and over.
+def resting_session(seed: int = 0, active_ticks: int = 90, rest_ticks: int = 270) -> Script:
+    session = synthetic_session(seed)
+
+    def script(vr_system: FakeVrSystem, tick: int) -> None:
+        if tick % (active_ticks + rest_ticks) < active_ticks:
+            session(vr_system, tick)
+            return
+
+        for device_index, device in vr_system.devices.items():
+            device.velocity = [0.0, 0.0, 0.0]
+            device.angular_velocity = [0.0, 0.0, 0.0]
+            for button_id in SCRIPTED_BUTTONS:
+                vr_system.press(device_index, button_id, False)
+                vr_system.touch(device_index, button_id, False)
+
+    return script
+
+
+# Both hands on a wheel in front of the HMD, turning it back and forth by up to amplitude radians, turns_per_second
+# times a second, with every device's velocities matching how it moves. Ticks are taken to come rate times a second.
+def steering_session(rate: float, amplitude: float = 1.0, turns_per_second: float = 0.5, radius: float = 0.2) -> Script:
+    frequency = 2 * math.pi * turns_per_second
+
+    def script(vr_system: FakeVrSystem, tick: int) -> None:
+        seconds = tick / rate
+        angle = amplitude * math.sin(frequency * seconds)
+        angular_speed = amplitude * frequency * math.cos(frequency * seconds)
+        for device_index, side in [(1, -1), (2, 1)]:
+            device = vr_system.devices[device_index]
+            device.pose = pose_matrix(0, 0, angle, (
+                side * radius * math.cos(angle),
+                1.0 + side * radius * math.sin(angle),
+                -0.4,
+            ))
+            device.velocity = [
+                -side * radius * math.sin(angle) * angular_speed,
+                side * radius * math.cos(angle) * angular_speed,
+                0.0,
+            ]
+            device.angular_velocity = [0.0, 0.0, angular_speed]
+
+    return script
+
+
+# Where a device at the given pose will be after moving for the given number of seconds at constant velocities, the
+# way openvr predicts poses. Angular velocities are in tracking space, so the rotation they make over that time
+# (by Rodrigues' formula) is applied on the left.
+def extrapolate_pose(
+        pose: list[list[float]],
+        velocity: list[float],
+        angular_velocity: list[float],
+        seconds: float) -> list[list[float]]:
+    angle = math.sqrt(sum(component * component for component in angular_velocity)) * seconds
+    if angle == 0:
+        rotation = [[1.0 if row == column else 0.0 for column in range(3)] for row in range(3)]
+    else:
+        x, y, z = (component * seconds / angle for component in angular_velocity)
+        c, s, t = math.cos(angle), math.sin(angle), 1 - math.cos(angle)
+        rotation = [
+            [t * x * x + c, t * x * y - s * z, t * x * z + s * y],
+            [t * x * y + s * z, t * y * y + c, t * y * z - s * x],
+            [t * x * z - s * y, t * y * z + s * x, t * z * z + c],
+        ]
+
+    return [
+        [
+            *(sum(rotation[row][k] * pose[k][column] for k in range(3)) for column in range(3)),
+            pose[row][3] + velocity[row] * seconds,
+        ]
+        for row in range(3)
+    ]
+
+
+# 3x4 transform for the given rotation (applied yaw about Y, then pitch about X, then roll about Z) and translation
+def pose_matrix(yaw: float, pitch: float, roll: float, translation: tuple[float, float, float]) -> list[list[float]]:
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    cr, sr = math.cos(roll), math.sin(roll)
+    rotation = [
+        [cy * cr + sy * sp * sr, -cy * sr + sy * sp * cr, sy * cp],
+        [cp * sr, cp * cr, -sp],
+        [-sy * cr + cy * sp * sr, sy * sr + cy * sp * cr, cy * cp],
+    ]
+
+    return [[*row, offset] for row, offset in zip(rotation, translation)]
+
+
+# Makes time.time() follow the fake system's ticks, tick_seconds apart, rather than the wall clock within the block,
+# so nodes timing gestures with it, like MultiClickButton, behave the same however fast a session is replayed
+@contextmanager
+def simulated_time(vr_system: FakeVrSystem, tick_seconds: float) -> Iterator[None]:
+    wall_clock = time.time
+    time.time = lambda: vr_system.tick * tick_seconds
+    try:
+        yield
+    finally:
+        time.time = wall_clock
@@ -0,0 +1,182 @@
+from __future__ import annotations
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+
+
+# Orders every node reachable from the root so that each node comes after all of its dependencies (Kahn's algorithm).
+# A node becomes ready once each of its dependency bindings has been visited, mirroring the readiness check
+# SerialProcessor makes every tick: nodes depending on something not reachable from the root are never scheduled.
+def topological_order(root_node: ValueGenerator[Any]) -> list[ValueConsumer]:
+    unvisited_bindings: dict[ValueConsumer, int] = {}
+    order: list[ValueConsumer] = []
+    ready = deque[ValueConsumer]([root_node])
+
+    while ready:
+        node = ready.popleft()
+        order.append(node)
+
+        if isinstance(node, ValueGenerator):
+            # a child bound to the same generator under two keys appears here twice, once per binding
+            for child in node.bound_children:
+                remaining = unvisited_bindings.get(child, len(child.dependencies)) - 1
+                unvisited_bindings[child] = remaining
+                if remaining == 0:
+                    ready.append(child)
+
+    return order
+
+
+# Every node that at least one sink depends on, directly or transitively (sinks included), ordered so that each node
+# comes after all of its dependencies. Walking backwards from the sinks never visits nodes that can't affect them.
+def dependency_order(sinks: Iterable[ValueConsumer]) -> list[ValueConsumer]:
+    order: list[ValueConsumer] = []
+    visited: set[ValueConsumer] = set()
+
+    for sink in sinks:
+        # iterative post-order walk, since long gesture chains can nest deeper than is comfortable to recurse
+        stack: list[tuple[ValueConsumer, bool]] = [(sink, False)]
+        while stack:
+            node, dependencies_done = stack.pop()
+            if dependencies_done:
+                order.append(node)
+                continue
+            if node in visited:
+                continue
+
+            visited.add(node)
+            stack.append((node, True))
+            for dependency in reversed(list(node.dependencies.values())):
+                if dependency not in visited:
+                    stack.append((dependency, False))
+
+    return order
+
+
+# a set of nested branches, as (branching node, dependency key) pairs from the outermost in
+Region = tuple[tuple[ValueConsumer, str], ...]
+
+
+# One node of a lazy schedule. Each of the node's branch dependencies gets its own sub-schedule of the nodes that only
+# feed that branch, which only needs running when the node selects it.
+@dataclass
+class ScheduleStep:
+    node: ValueConsumer
+    branches: dict[str, list[ScheduleStep]] = field(default_factory=dict)
+
+
+def common_prefix(regions: list[Region]) -> Region:
+    if not regions:
+        return ()
+
+    prefix = regions[0]
+    for region in regions[1:]:
+        length = 0
+        while length < min(len(prefix), len(region)) and prefix[length] == region[length]:
+            length += 1
+        prefix = prefix[:length]
+
+    return prefix
+
+
+# The innermost region each node of a dependency order sits in. A node is inside a branch when every path from it to
+# a sink runs through that branch, so it only needs evaluating when the branch is selected. Nodes that some sink needs
+# unconditionally get the empty region.
+def branch_regions(sinks: Iterable[ValueConsumer], order: list[ValueConsumer]) -> dict[ValueConsumer, Region]:
+    sink_set = set(sinks)
+    regions: dict[ValueConsumer, Region] = {}
+
+    # consumers come after their dependencies, so walking backwards places every consumer before what it reads
+    for node in reversed(order):
+        candidates: list[Region] = [()] if node in sink_set else []
+        if isinstance(node, ValueGenerator):
+            for consumer in set(node.bound_children):
+                if consumer not in regions:
+                    # bound, but not scheduled: pruned, or replaced by a graph pass
+                    continue
+                for key, dependency in consumer.dependencies.items():
+                    if dependency is node:
+                        region = regions[consumer]
+                        if key in consumer.branch_dependencies:
+                            region = (*region, (consumer, key))
+                        candidates.append(region)
+
+        regions[node] = common_prefix(candidates)
+
+    return regions
+
+
+# Nests a dependency order into a lazy schedule, moving nodes that only feed a branch under the branching node's step.
+def lazy_schedule(sinks: Iterable[ValueConsumer], order: list[ValueConsumer]) -> list[ScheduleStep]:
+    regions = branch_regions(sinks, order)
+    steps_by_region: dict[Region, list[ScheduleStep]] = defaultdict(list)
+
+    for node in order:
+        region = regions[node]
+        branches = {key: steps_by_region[(*region, (node, key))] for key in node.branch_dependencies}
+        steps_by_region[region].append(ScheduleStep(node, branches))
+
+    return steps_by_region[()]
+
+
+# every node a step evaluates: its own, and those of its branches' sub-schedules
+def step_nodes(step: ScheduleStep) -> list[ValueConsumer]:
+    nodes = [step.node]
+    for branch in step.branches.values():
+        for branch_step in branch:
+            nodes.extend(step_nodes(branch_step))
+
+    return nodes
+
+
+# Splits the top level of a lazy schedule into a shared part and partitions that don't depend on each other, so that
+# once the shared part has run, the partitions can be evaluated in any order, or at the same time. The shared part is
+# every step containing one of shared_nodes, plus everything those depend on. The rest are grouped into the connected
+# components they form among themselves: nodes reading two otherwise separate parts of the graph, like a wheel
+# reading both hands, join them into one partition. Steps keep their order within each part, and branches stay with
+# the step that selects them.
+def partition_schedule(
+        steps: list[ScheduleStep],
+        shared_nodes: Iterable[ValueConsumer]) -> tuple[list[ScheduleStep], list[list[ScheduleStep]]]:
+    nodes_by_step = [step_nodes(step) for step in steps]
+    step_indexes = {node: index for index, nodes in enumerate(nodes_by_step) for node in nodes}
+    shared_node_set = set(shared_nodes)
+    shared = [any(node in shared_node_set for node in nodes) for nodes in nodes_by_step]
+
+    def dependency_steps(index: int) -> set[int]:
+        return {
+            step_indexes[dependency]
+            for node in nodes_by_step[index]
+            for dependency in node.dependencies.values()
+            if dependency in step_indexes
+        } - {index}
+
+    # dependencies come before their consumers, so walking backwards reaches each shared step before what it reads
+    for index in reversed(range(len(steps))):
+        if shared[index]:
+            for dependency_index in dependency_steps(index):
+                shared[dependency_index] = True
+
+    # union-find over the remaining steps, joining each to the unshared steps it reads
+    parents = list(range(len(steps)))
+
+    def find(index: int) -> int:
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for index in range(len(steps)):
+        if not shared[index]:
+            for dependency_index in dependency_steps(index):
+                if not shared[dependency_index]:
+                    parents[find(index)] = find(dependency_index)
+
+    partitions: dict[int, list[ScheduleStep]] = {}
+    for index, step in enumerate(steps):
+        if not shared[index]:
+            partitions.setdefault(find(index), []).append(step)
+
+    return [step for index, step in enumerate(steps) if shared[index]], list(partitions.values())
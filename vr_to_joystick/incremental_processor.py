@@ -0,0 +1,66 @@
+from dataclasses import dataclass, field
+from typing import Any
+
+from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+from vr_to_joystick.scheduled_processor import ScheduledProcessor
+
+
+# Only updates nodes whose inputs changed value this tick, plus any node that asked for another tick after its last
+# update (see ValueConsumer.needs_tick). Changes are pushed forward to the consumers of each changed node, so a tick
+# where nothing moves costs little more than polling the VR system and the nodes reading directly from it.
+# This walks the flat schedule rather than the lazy one, so unselected branches are still kept up to date.
+@dataclass
+class IncrementalProcessor(ScheduledProcessor):
+    # positions in the schedule of each scheduled node's consumers
+    consumer_positions: list[tuple[int, ...]] = field(init=False)
+    # set for each schedule position that has to be updated this tick
+    stale: bytearray = field(init=False)
+
+    def compile(self) -> None:
+        super().compile()
+
+        positions = {node: position for position, node in enumerate(self.schedule)}
+        consumers: list[dict[int, None]] = [{} for _ in self.schedule]
+        for position, node in enumerate(self.schedule):
+            for dependency in node.dependencies.values():
+                if dependency in positions:
+                    consumers[positions[dependency]][position] = None
+
+        self.consumer_positions = [tuple(node_consumers) for node_consumers in consumers]
+        # nothing has a value yet, so everything is updated on the first tick
+        self.stale = bytearray(b'\x01' * len(self.schedule))
+
+    def process_for_tick(self, tick: int) -> None:
+        stale = self.stale
+
+        for position, node in enumerate(self.schedule):
+            if not stale[position]:
+                continue
+            stale[position] = 0
+
+            if self._update_node(node, tick):
+                for consumer_position in self.consumer_positions[position]:
+                    stale[consumer_position] = 1
+
+            if node.needs_tick():
+                # only positions after this one have been visited already this tick, so this lands next tick
+                stale[position] = 1
+
+        if self.value_store is not None:
+            self.value_store.capture()
+
+    # returns whether the node's value changed
+    @staticmethod
+    def _update_node(node: ValueConsumer, tick: int) -> bool:
+        if not isinstance(node, ValueGenerator):
+            node.update(tick)
+            return False
+
+        if node.changes_every_tick or node.last_tick_update < 0:
+            node.update(tick)
+            return True
+
+        previous_value: Any = node.current_value
+        node.update(tick)
+
+        return bool(node.current_value != previous_value)
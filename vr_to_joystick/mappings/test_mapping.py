@@ -1,7 +1,6 @@
 import math
 
 import openvr
-from pyvjoy.vjoydevice import HID_USAGE_X, HID_USAGE_Y, HID_USAGE_Z, HID_USAGE_RX, HID_USAGE_RY, HID_USAGE_RZ, HID_USAGE_SL0
 
 from vr_to_joystick.controller_mapping import ControllerMapping
 from vr_to_joystick.nodes.axis import ControllerAxis, VXAxis, VYAxis, VZAxis, XAxis, YAxis, ZAxis
@@ -10,6 +9,7 @@ from vr_to_joystick.nodes.button import DirectButton
 from vr_to_joystick.nodes.button_helpers import AxisThresholdButton
 from vr_to_joystick.nodes.types import Axis, Button
 from vr_to_joystick.nodes.vr_system_state import ControllerStateByType, ControllerStateGenerator, VrSystemState
+from vr_to_joystick.outputs.backend import AXIS_RX, AXIS_RY, AXIS_RZ, AXIS_SL0, AXIS_X, AXIS_Y, AXIS_Z
 
 ATAN_AXIS_SCALAR = 1 / (2 * math.pi)
 TOUCHPAD_EDGE_BUTTON_THRESHOLD = 0.8
@@ -25,13 +25,13 @@ STANDARD_BUTTONS = [
 
 def standard_steamvr_controller_axis_profile(controller_state: ControllerStateGenerator) -> dict[int, Axis]:
     return {
-        HID_USAGE_X: ScaleAxis(1, 0)(XAxis(controller_state)),
-        HID_USAGE_Y: ScaleAxis(1, 1.5)(YAxis(controller_state)),
-        HID_USAGE_Z: ScaleAxis(-1, -0.5)(ZAxis(controller_state)),
-        HID_USAGE_RX: ScaleAxis(1, 0)(VXAxis(controller_state)),
-        HID_USAGE_RY: ScaleAxis(1, 0)(VYAxis(controller_state)),
-        HID_USAGE_RZ: ScaleAxis(1, 0)(VZAxis(controller_state)),
-        HID_USAGE_SL0: ControllerAxis(1, 'x')(controller_state)  # trigger throttle
+        AXIS_X: ScaleAxis(1, 0)(XAxis(controller_state)),
+        AXIS_Y: ScaleAxis(1, 1.5)(YAxis(controller_state)),
+        AXIS_Z: ScaleAxis(-1, -0.5)(ZAxis(controller_state)),
+        AXIS_RX: ScaleAxis(1, 0)(VXAxis(controller_state)),
+        AXIS_RY: ScaleAxis(1, 0)(VYAxis(controller_state)),
+        AXIS_RZ: ScaleAxis(1, 0)(VZAxis(controller_state)),
+        AXIS_SL0: ControllerAxis(1, 'x')(controller_state)  # trigger throttle
     }
 
 
@@ -1,5 +1,4 @@
 import openvr
-from pyvjoy.vjoydevice import HID_USAGE_X, HID_USAGE_Y, HID_USAGE_Z
 
 from vr_to_joystick.controller_mapping import ControllerMapping
 from vr_to_joystick.nodes.axis import ControllerAxis, ZAxis
@@ -9,6 +8,7 @@ from vr_to_joystick.nodes.button_helpers import AxisThresholdButton, GestureButt
 from vr_to_joystick.nodes.composite.axis import InvertedAxis
 from vr_to_joystick.nodes.types import Axis, Button
 from vr_to_joystick.nodes.vr_system_state import ControllerStateByType, VrSystemState
+from vr_to_joystick.outputs.backend import AXIS_X, AXIS_Y, AXIS_Z
 
 
 # CONFIG SETTINGS FOR MAPPING
@@ -92,9 +92,9 @@ class ThrottleMapping(ControllerMapping):
         thumb_y = ControllerAxis(2, 'y')(controller_state)
 
         return {
-            HID_USAGE_X: ScaleAxis(0.5, 0)(thumb_x),
-            HID_USAGE_Y: ScaleAxis(0.5, 0)(thumb_y),
-            HID_USAGE_Z: InvertedAxis(PushPullAxis(grip_button, ZAxis(controller_state)))
+            AXIS_X: ScaleAxis(0.5, 0)(thumb_x),
+            AXIS_Y: ScaleAxis(0.5, 0)(thumb_y),
+            AXIS_Z: InvertedAxis(PushPullAxis(grip_button, ZAxis(controller_state)))
         }
 
     def generate_button_mapping(self, root_node: VrSystemState) -> dict[int, Button]:
@@ -2,7 +2,6 @@ import math
 from typing import Iterable
 
 import openvr
-from pyvjoy.vjoydevice import HID_USAGE_X, HID_USAGE_Y, HID_USAGE_Z, HID_USAGE_RX, HID_USAGE_RZ, HID_USAGE_SL0, HID_USAGE_SL1
 
 from vr_to_joystick.controller_mapping import ControllerMapping
 from vr_to_joystick.nodes.axis import ControllerAxis, PitchAxis, RollAxis, XAxis, YAxis, ZAxis
@@ -15,8 +14,10 @@ from vr_to_joystick.nodes.composite.button import AndButton, NotButton, StickyPa
 from vr_to_joystick.nodes.event_triggers import HapticPulseTrigger
 from vr_to_joystick.nodes.types import Axis, Button
 from vr_to_joystick.nodes.value_generator import ValueConsumer
-from vr_to_joystick.nodes.vr_system_state import ControllerStateByType, ControllerStateGenerator, VrSystemState
+from vr_to_joystick.nodes.vr_system_state import ControllerStateByType, ControllerStateGenerator, \
+    HmdRelativeControllerStateByType, VrSystemState
 from vr_to_joystick.nodes.wheel import Wheel
+from vr_to_joystick.outputs.backend import AXIS_RX, AXIS_RZ, AXIS_SL0, AXIS_SL1, AXIS_X, AXIS_Y, AXIS_Z
 
 
 TWIST_GESTURE_THRESHOLD = 0.8
@@ -43,16 +44,18 @@ class WheelMapping(ControllerMapping):
 
         return {
             # left thumbstick
-            HID_USAGE_X: ScaleAxis(0.5, 0)(ControllerAxis(2, 'x')(left_controller_state)),
-            HID_USAGE_Y: ScaleAxis(0.5, 0)(ControllerAxis(2, 'y')(left_controller_state)),
+            AXIS_X: ScaleAxis(0.5, 0)(ControllerAxis(2, 'x')(left_controller_state)),
+            AXIS_Y: ScaleAxis(0.5, 0)(ControllerAxis(2, 'y')(left_controller_state)),
             # left/right roll axis of HMD
-            HID_USAGE_Z: ScaleAxis(HALF_CIRCLE_ROTATION_SCALAR, 0)(DeadzoneAxis(math.pi / 10)(RollAxis(hmd_state))),
+            AXIS_Z: ScaleAxis(HALF_CIRCLE_ROTATION_SCALAR, 0)(DeadzoneAxis(math.pi / 10)(RollAxis(hmd_state))),
             # pitch axis of HMD
-            HID_USAGE_RX: ScaleAxis(HALF_CIRCLE_ROTATION_SCALAR, 0)(DeadzoneAxis(math.pi / 10)(PitchAxis(hmd_state))),
+            AXIS_RX: ScaleAxis(HALF_CIRCLE_ROTATION_SCALAR, 0)(DeadzoneAxis(math.pi / 10)(PitchAxis(hmd_state))),
             # wheel rotation is tracked up to 1/4 turn in either direction (i.e. 90 degrees)
             # note that we subtract the HMD roll, so you can tilt your entire body
-            # left/right without it causing your vehicle to steer
-            HID_USAGE_RZ: GatedAxis(0.5)(
+            # left/right without it causing your vehicle to steer. the wheel itself is read in the world frame,
+            # since in the HMD's frame turning your head (e.g. to check a mirror) would skew it. steering is read
+            # from predicted poses, to make up for the time it takes for it to reach the game
+            AXIS_RZ: GatedAxis(0.5)(
                 # you can toggle steering tracking by clicking the grip 3x
                 NotButton(
                     ToggleButton(
@@ -69,12 +72,12 @@ class WheelMapping(ControllerMapping):
                     0.0)(
                     DifferenceAxis(
                         Wheel(
-                            left_controller_state,
-                            right_controller_state),
-                        RollAxis(hmd_state)))
+                            ControllerStateByType('controller', 'left_hand', predicted=True)(root_node),
+                            ControllerStateByType('controller', 'right_hand', predicted=True)(root_node)),
+                        RollAxis(ControllerStateByType('hmd', predicted=True)(root_node))))
             ),
-            HID_USAGE_SL0: ControllerAxis(1, 'x')(left_controller_state),  # left trigger
-            HID_USAGE_SL1: ControllerAxis(1, 'x')(right_controller_state),  # right trigger
+            AXIS_SL0: ControllerAxis(1, 'x')(left_controller_state),  # left trigger
+            AXIS_SL1: ControllerAxis(1, 'x')(right_controller_state),  # right trigger
         }
 
     def trackpad_edge_buttons(self, controller_state: ControllerStateGenerator,
@@ -129,15 +132,16 @@ class WheelMapping(ControllerMapping):
         ]
 
     # fire gesture - activates with a strong tilt, but doesn't deactivate until tilt decreases significantly.
+    # controller_pitch should be relative to the HMD
     @staticmethod
-    def sticky_forward_tilt(grip: Button, controller_pitch: Axis, hmd_pitch: Axis) -> StickyPairButton:
+    def sticky_forward_tilt(grip: Button, controller_pitch: Axis) -> StickyPairButton:
         initiator = GestureButton(-TWIST_GESTURE_THRESHOLD, '<', sticky=False)(
             grip,
-            DifferenceAxis(controller_pitch, hmd_pitch),
+            controller_pitch,
         )
         limiter = GestureButton(-TWIST_GESTURE_THRESHOLD / 2, '<', sticky=False)(
             grip,
-            DifferenceAxis(controller_pitch, hmd_pitch),
+            controller_pitch,
         )
 
         return StickyPairButton(initiator, limiter)
@@ -146,29 +150,29 @@ class WheelMapping(ControllerMapping):
         hmd_state = ControllerStateByType('hmd')(root_node)
         left_controller_state = ControllerStateByType('controller', 'left_hand')(root_node)
         right_controller_state = ControllerStateByType('controller', 'right_hand')(root_node)
+        # the same controllers, seen from the HMD
+        left_relative_state = HmdRelativeControllerStateByType('controller', 'left_hand')(root_node)
+        right_relative_state = HmdRelativeControllerStateByType('controller', 'right_hand')(root_node)
 
         grip_button = DirectButton(openvr.k_EButton_Grip, 'press')
 
         left_controller_grip = grip_button(left_controller_state)
         right_controller_grip = grip_button(right_controller_state)
 
-        hmd_pitch = PitchAxis(hmd_state)
         hmd_y = YAxis(hmd_state)
         hmd_z = ZAxis(hmd_state)
 
-        left_controller_pitch = PitchAxis(left_controller_state)
-        left_controller_roll = RollAxis(left_controller_state)
         left_controller_x = XAxis(left_controller_state)
         left_controller_y = YAxis(left_controller_state)
         left_controller_z = ZAxis(left_controller_state)
 
-        right_controller_pitch = PitchAxis(right_controller_state)
         right_controller_roll = RollAxis(right_controller_state)
         right_controller_x = XAxis(right_controller_state)
         right_controller_y = YAxis(right_controller_state)
         right_controller_z = ZAxis(right_controller_state)
 
-        # down-then-back gesture for handbrake
+        # down-then-back gesture for handbrake. like steering, it's measured in the world frame less the HMD's
+        # position, since along the HMD's own axes, looking off to the side would turn pulling back into sideways
         l_pull_down_then_back_gesture = SequentialGesture(
             left_controller_grip,
             (-TRANSLATIONAL_GESTURE_THRESHOLD, DifferenceAxis(left_controller_y, hmd_y)),
@@ -201,8 +205,8 @@ class WheelMapping(ControllerMapping):
         buttons = [
             l_pull_down_then_back_gesture,  # handbrake by pressing left grip, then pulling down and back
             # primary/secondary fire by pressing left/right grip and tilting controller forward
-            self.sticky_forward_tilt(left_controller_grip, left_controller_pitch, hmd_pitch),
-            self.sticky_forward_tilt(right_controller_grip, right_controller_pitch, hmd_pitch),
+            self.sticky_forward_tilt(left_controller_grip, PitchAxis(left_relative_state)),
+            self.sticky_forward_tilt(right_controller_grip, PitchAxis(right_relative_state)),
             CircleGesture(
                 True,
                 TRANSLATIONAL_GESTURE_THRESHOLD,
@@ -236,8 +240,8 @@ class WheelMapping(ControllerMapping):
         grip_button = DirectButton(openvr.k_EButton_Grip, 'press')
 
         return [
-            HapticPulseTrigger(root_node.device_id_for_type('controller', 'left_hand'), {'just_pressed', 'just_unpressed'})(
-                root_node.vr_system,
+            HapticPulseTrigger(root_node.track_device('controller', 'left_hand'), {'just_pressed', 'just_unpressed'})(
+                root_node,
                 MultiClickButton(0.5, 3)(
                     AndButton(
                         grip_button(left_controller_state),
@@ -245,8 +249,8 @@ class WheelMapping(ControllerMapping):
                     )
                 )
             ),
-            HapticPulseTrigger(root_node.device_id_for_type('controller', 'right_hand'), {'just_pressed', 'just_unpressed'})(
-                root_node.vr_system,
+            HapticPulseTrigger(root_node.track_device('controller', 'right_hand'), {'just_pressed', 'just_unpressed'})(
+                root_node,
                 MultiClickButton(0.5, 3)(
                     AndButton(
                         grip_button(left_controller_state),
@@ -1,5 +1,4 @@
-import math
-from typing import Any, Hashable, Literal
+from typing import Any, Hashable, Literal, Optional
 
 from vr_to_joystick.nodes.vr_system_state import ControllerStateConsumer
 
@@ -14,8 +13,10 @@ def TranslationalAxis(pose_index: int) -> type[DirectAxis]:
             return [pose_index]
 
         def generate_output(self, inputs: dict[str, Any]) -> float:
-            return inputs['base_state']['pose'][pose_index][3]  # type: ignore
+            return float(inputs['base_state']['translation'][pose_index])
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return f"float({inputs['base_state']}['translation'][{pose_index}])"
     return _ConfiguredTranslationalAxis
 
 
@@ -39,8 +40,10 @@ def VelocityAxis(axis_name: AxisName) -> type[DirectAxis]:
             return [axis_index]
 
         def generate_output(self, inputs: dict[str, Any]) -> float:
-            return inputs['base_state']['velocity'][axis_index]  # type: ignore
+            return float(inputs['base_state']['velocity'][axis_index])
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return f"float({inputs['base_state']}['velocity'][{axis_index}])"
     return _ConfiguredVelocityAxis
 
 
@@ -49,23 +52,24 @@ VYAxis = VelocityAxis('y')
 VZAxis = VelocityAxis('z')
 
 
-class YawAxis(DirectAxis):
-    def generate_output(self, inputs: dict[str, Any]) -> float:
-        return -1 * math.asin(inputs['base_state']['pose'][2][0])
-
-
-class PitchAxis(DirectAxis):
-    def generate_output(self, inputs: dict[str, Any]) -> float:
-        pose = inputs['base_state']['pose']
+# Angles are computed for every device at once by PoseDecomposition, so these only look them up
+def EulerAngleAxis(angle_index: int) -> type[DirectAxis]:
+    class _ConfiguredEulerAngleAxis(DirectAxis):
+        @classmethod
+        def _parameterized_on(cls) -> list[Hashable]:
+            return [angle_index]
 
-        return math.atan2(pose[2][1], pose[2][2])
+        def generate_output(self, inputs: dict[str, Any]) -> float:
+            return float(inputs['base_state']['euler'][angle_index])
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return f"float({inputs['base_state']}['euler'][{angle_index}])"
+    return _ConfiguredEulerAngleAxis
 
-class RollAxis(DirectAxis):
-    def generate_output(self, inputs: dict[str, Any]) -> float:
-        pose = inputs['base_state']['pose']
 
-        return math.atan2(pose[1][0], pose[0][0])
+YawAxis = EulerAngleAxis(0)
+PitchAxis = EulerAngleAxis(1)
+RollAxis = EulerAngleAxis(2)
 
 
 ControllerAxisType = Literal['x', 'y']
@@ -87,4 +91,7 @@ def ControllerAxis(axis_index: int, axis_type: ControllerAxisType = 'x') -> type
 
             return raxis.y  # type: ignore
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return f"{inputs['base_state']}['controller_state'].rAxis[{axis_index}].{axis_type}"
+
     return _ConfiguredControllerAxis
@@ -1,6 +1,8 @@
-from typing import Any, Hashable, Type
+import math
+from typing import Any, Hashable, Optional, Type
 
 from vr_to_joystick.nodes.types import Axis, Button
+from vr_to_joystick.nodes.value_generator import kernel_literal
 
 
 class AxisMutator(Axis):
@@ -11,6 +13,15 @@ class AxisMutator(Axis):
 
     def generate_output(self, inputs: dict[str, float]) -> float: ...
 
+    # (scale, offset) if this mutator maps its parent's value x to exactly scale * x + offset
+    def affine_form(self) -> Optional[tuple[float, float]]:
+        return None
+
+    # (deadzone, axis_min, axis_max) if this mutator zeroes values within the deadzone and then clamps the result
+    # to the given range, i.e. is equivalent to the matching PiecewiseAxis
+    def piecewise_form(self) -> Optional[tuple[float, float, float]]:
+        return None
+
 
 # Slides, then scales the given axis based on the factor and zero point given.
 # Meant for use scaling an axis to the 0-to-1 range that VJoy expects, with the axis's zero point at 0.5
@@ -23,6 +34,14 @@ def ScaleAxis(scaling_factor: float, zero_point: float, resulting_zero_point: fl
         def generate_output(self, inputs: dict[str, float]) -> float:
             return (inputs['parent_axis'] - zero_point) * scaling_factor + resulting_zero_point
 
+        def affine_form(self) -> Optional[tuple[float, float]]:
+            return scaling_factor, resulting_zero_point - zero_point * scaling_factor
+
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return (
+                f"({inputs['parent_axis']} - {kernel_literal(zero_point)}) * {kernel_literal(scaling_factor)}"
+                f" + {kernel_literal(resulting_zero_point)}"
+            )
     return _ConfiguredScaleAxis
 
 
@@ -38,6 +57,12 @@ def AxisShifter(axis_min: float, axis_max: float, shift_amount: float) -> type[A
 
             return (inputs['parent_axis'] - axis_min + shift_amount) % axis_range + axis_min
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            axis_range = axis_max - axis_min
+            return (
+                f"({inputs['parent_axis']} - {kernel_literal(axis_min)} + {kernel_literal(shift_amount)})"
+                f" % {kernel_literal(axis_range)} + {kernel_literal(axis_min)}"
+            )
     return _ConfiguredAxisShifter
 
 
@@ -51,6 +76,11 @@ def AxisClamp(axis_min: float, axis_max: float) -> type[AxisMutator]:
         def generate_output(self, inputs: dict[str, float]) -> float:
             return min(axis_max, max(inputs['parent_axis'], axis_min))
 
+        def piecewise_form(self) -> Optional[tuple[float, float, float]]:
+            return 0.0, axis_min, axis_max
+
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return f"min({kernel_literal(axis_max)}, max({inputs['parent_axis']}, {kernel_literal(axis_min)}))"
     return _ConfiguredAxisClamp
 
 
@@ -66,9 +96,42 @@ def DeadzoneAxis(deadzone: float) -> type[AxisMutator]:
 
             return inputs['parent_axis']
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            parent_axis = inputs['parent_axis']
+            return f"(0.0 if abs({parent_axis}) < {kernel_literal(deadzone)} else {parent_axis})"
+
+        def piecewise_form(self) -> Optional[tuple[float, float, float]]:
+            return deadzone, -math.inf, math.inf
+
     return _ConfiguredDeadzoneAxis
 
 
+# A DeadzoneAxis followed by an AxisClamp in a single node. Mostly produced by the graph optimizer when fusing
+# chains of clamps and deadzones, but just as usable directly.
+def PiecewiseAxis(deadzone: float, axis_min: float, axis_max: float) -> type[AxisMutator]:
+    class _ConfiguredPiecewiseAxis(AxisMutator):
+        @classmethod
+        def _parameterized_on(cls) -> list[Hashable]:
+            return [deadzone, axis_min, axis_max]
+
+        def generate_output(self, inputs: dict[str, float]) -> float:
+            value = 0.0 if abs(inputs['parent_axis']) < deadzone else inputs['parent_axis']
+
+            return min(axis_max, max(value, axis_min))
+
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            parent_axis = inputs['parent_axis']
+            return (
+                f"min({kernel_literal(axis_max)}, max((0.0 if abs({parent_axis}) < {kernel_literal(deadzone)} "
+                f"else {parent_axis}), {kernel_literal(axis_min)}))"
+            )
+
+        def piecewise_form(self) -> Optional[tuple[float, float, float]]:
+            return deadzone, axis_min, axis_max
+
+    return _ConfiguredPiecewiseAxis
+
+
 # Axis that is reset to zero when the specified button is pressed.
 class ResettableAxis(Axis):
     requirements = {'reset_button', 'parent_axis'}
@@ -90,6 +153,7 @@ class ResettableAxis(Axis):
 def GatedAxis(disabled_value: float = 0.0) -> Type[Axis]:
     class _ConfiguredGatedAxis(Axis):
         requirements = {'gate_button', 'parent_axis'}
+        branch_dependencies = frozenset({'parent_axis'})
 
         @classmethod
         def _parameterized_on(cls) -> list[Hashable]:
@@ -104,6 +168,18 @@ def GatedAxis(disabled_value: float = 0.0) -> Type[Axis]:
 
             return disabled_value
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return (
+                f"({inputs['parent_axis']} if {inputs['gate_button']}['active']"
+                f" else {kernel_literal(disabled_value)})"
+            )
+
+        def branch_selected(self, key: str, inputs: dict[str, Any]) -> bool:
+            return inputs['gate_button']['active']  # type: ignore
+
+        def branch_condition(self, key: str, inputs: dict[str, str]) -> Optional[str]:
+            return f"{inputs['gate_button']}['active']"
+
     return _ConfiguredGatedAxis
 
 
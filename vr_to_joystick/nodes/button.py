@@ -1,10 +1,10 @@
-from typing import Hashable
+from typing import Hashable, Optional
 
 from vr_to_joystick.nodes.types import BaseButton, ButtonEventType, ButtonState
 from vr_to_joystick.nodes.vr_system_state import ControllerStateConsumer, ControllerStatePackage
 
 
-# Basic button class. Reads the current value of an actual button on the controller.
+# Basic button class. Reads the current value of an actual button on the controller, as one bit of its button mask.
 def DirectButton(button_id: int, event_type: ButtonEventType) -> type[ControllerStateConsumer[ButtonState]]:
     class _ConfiguredButton(ControllerStateConsumer[ButtonState], BaseButton):
 
@@ -13,12 +13,15 @@ def DirectButton(button_id: int, event_type: ButtonEventType) -> type[Controller
             return [button_id, event_type]
 
         def get_button_state_this_tick(self, inputs: dict[str, ControllerStatePackage]) -> bool:
-            button_states = inputs['base_state']['button_state']
             if event_type == 'press':
-                target_states = button_states['pressed']
+                button_mask = inputs['base_state']['buttons_pressed']
             else:
-                target_states = button_states['touched']
+                button_mask = inputs['base_state']['buttons_touched']
 
-            return target_states[button_id]
+            return bool(button_mask >> button_id & 1)
+
+        def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            button_mask = 'buttons_pressed' if event_type == 'press' else 'buttons_touched'
+            return f"{inputs['base_state']}['{button_mask}'] >> {button_id} & 1"
 
     return _ConfiguredButton
@@ -1,10 +1,11 @@
 from functools import reduce
 import time
-from typing import Any, Callable, Hashable, Literal, Union
+from typing import Any, Callable, Hashable, Literal, Optional, Union
 
 from vr_to_joystick.nodes.axis_helpers import DeltaAxis
 from vr_to_joystick.nodes.composite.button import AndButton, StickyPairButton
 from vr_to_joystick.nodes.types import Axis, BaseButton, Button
+from vr_to_joystick.nodes.value_generator import kernel_literal
 
 
 Comparator = Literal['<', '<=', '>', '>=']
@@ -47,6 +48,9 @@ def AxisThresholdButton(threshold: float, comparator: Comparator) -> type[Button
         def get_button_state_this_tick(self, inputs: dict[str, Any]) -> bool:
             return self.comparator_function()(inputs['parent_axis'])
 
+        def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            return f"{inputs['parent_axis']} {comparator} {kernel_literal(threshold)}"
+
     return _ConfiguredAxisThresholdButton
 
 
@@ -89,7 +93,7 @@ def SequentialGesture(activation_button: Button, *gestures: tuple[float, Axis])
 
 
 # Gesture that recognizes moving in a circle. Assumes that the circle begins at the top.
-# To recognize circular movement independent of its starting point, use an OrButton to chain four of these together,
+# To recognize circular movement independent of its starting point, use an AnyButton to combine four of these,
 # each recognizing a different starting point. I don't recommend this.
 def CircleGesture(clockwise: bool, size: float, x_axis: Axis, y_axis: Axis, activate_button: Button) -> Button:
     leftright_size = (1 if clockwise else -1) * size
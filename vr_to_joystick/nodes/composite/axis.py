@@ -1,11 +1,15 @@
 from abc import abstractmethod
-from typing import Any
+from functools import reduce
+import operator
+from typing import Any, Optional
 
+from vr_to_joystick.nodes.axis_helpers import AxisMutator
 from vr_to_joystick.nodes.types import Axis, Button
 
 
 class SwitchAxis(Axis):
     requirements = {'switch_button', 'off_axis', 'on_axis'}
+    branch_dependencies = frozenset({'off_axis', 'on_axis'})
 
     def __init__(self, switch_button: Button, off_axis: Axis, on_axis: Axis):
         super().__init__(dependencies={'switch_button': switch_button, 'off_axis': off_axis, 'on_axis': on_axis})
@@ -16,6 +20,18 @@ class SwitchAxis(Axis):
 
         return inputs['off_axis']  # type: ignore
 
+    def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return f"({inputs['on_axis']} if {inputs['switch_button']}['active'] else {inputs['off_axis']})"
+
+    def branch_selected(self, key: str, inputs: dict[str, Any]) -> bool:
+        return inputs['switch_button']['active'] == (key == 'on_axis')  # type: ignore
+
+    def branch_condition(self, key: str, inputs: dict[str, str]) -> Optional[str]:
+        if key == 'on_axis':
+            return f"{inputs['switch_button']}['active']"
+
+        return f"not {inputs['switch_button']}['active']"
+
 
 class PairAxis(Axis):
     requirements = {'axis_a', 'axis_b'}
@@ -30,47 +46,153 @@ class PairAxis(Axis):
     def generate_output(self, inputs: dict[str, Any]) -> float:
         return self.combine_states(inputs['axis_a'], inputs['axis_b'])
 
+    # expression equivalent to combine_states, for compiled kernels
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return None
+
+    def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return self.combine_expression(inputs['axis_a'], inputs['axis_b'])
+
 
 class SumAxis(PairAxis):
     def combine_states(self, axis_a: float, axis_b: float) -> float:
         return axis_a + axis_b
 
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return f"({axis_a} + {axis_b})"
+
 
 class DifferenceAxis(PairAxis):
     def combine_states(self, axis_a: float, axis_b: float) -> float:
         return axis_a - axis_b
 
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return f"({axis_a} - {axis_b})"
+
 
 class ProductAxis(PairAxis):
     def combine_states(self, axis_a: float, axis_b: float) -> float:
         return axis_a * axis_b
 
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return f"({axis_a} * {axis_b})"
+
 
 class QuotientAxis(PairAxis):
     def combine_states(self, axis_a: float, axis_b: float) -> float:
         return axis_a / axis_b
 
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return f"({axis_a} / {axis_b})"
+
 
 class MaxAxis(PairAxis):
     def combine_states(self, axis_a: float, axis_b: float) -> float:
         return max(axis_a, axis_b)
 
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return f"max({axis_a}, {axis_b})"
+
 
 class MinAxis(PairAxis):
     def combine_states(self, axis_a: float, axis_b: float) -> float:
         return min(axis_a, axis_b)
 
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return f"min({axis_a}, {axis_b})"
 
-class InvertedAxis(Axis):
-    requirements = {'parent_axis'}
 
-    def __init__(self, parent_axis: Axis):
-        super().__init__(dependencies={'parent_axis': parent_axis})
+# Combines any number of axes in a single node, e.g. SumOfAxes(a, b, c) rather than SumAxis(SumAxis(a, b), c).
+# Dependencies are keyed axis_0, axis_1, ... in the order given.
+class NaryAxis(Axis):
+    # the pairwise axes that nest into this one, for the optimizer's flattening pass
+    flattens: tuple[type[PairAxis], ...] = ()
+
+    def __init__(self, *axes: Axis):
+        if not axes:
+            raise ValueError(f"{self.__class__.__name__} needs at least one axis to combine!")
+
+        super().__init__(dependencies={f'axis_{index}': axis for index, axis in enumerate(axes)})
+
+    @abstractmethod
+    def combine_all(self, values: list[float]) -> float:
+        pass
 
+    def generate_output(self, inputs: dict[str, Any]) -> float:
+        return self.combine_all(list(inputs.values()))
+
+    # expression equivalent to combine_all, for compiled kernels
+    def combine_all_expression(self, values: list[str]) -> Optional[str]:
+        return None
+
+    def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return self.combine_all_expression([inputs[key] for key in self.dependencies])
+
+
+# adds left to right, like a chain of SumAxis would (rather than sum(), which may compensate for rounding)
+class SumOfAxes(NaryAxis):
+    flattens = (SumAxis,)
+
+    def combine_all(self, values: list[float]) -> float:
+        return reduce(operator.add, values)
+
+    def combine_all_expression(self, values: list[str]) -> Optional[str]:
+        return f"({' + '.join(values)})"
+
+
+class ProductOfAxes(NaryAxis):
+    flattens = (ProductAxis,)
+
+    def combine_all(self, values: list[float]) -> float:
+        return reduce(operator.mul, values)
+
+    def combine_all_expression(self, values: list[str]) -> Optional[str]:
+        return f"({' * '.join(values)})"
+
+
+class MaxOfAxes(NaryAxis):
+    flattens = (MaxAxis,)
+
+    def combine_all(self, values: list[float]) -> float:
+        return max(values)
+
+    def combine_all_expression(self, values: list[str]) -> Optional[str]:
+        return f"max({', '.join(values)})" if len(values) > 1 else values[0]
+
+
+class MinOfAxes(NaryAxis):
+    flattens = (MinAxis,)
+
+    def combine_all(self, values: list[float]) -> float:
+        return min(values)
+
+    def combine_all_expression(self, values: list[str]) -> Optional[str]:
+        return f"min({', '.join(values)})" if len(values) > 1 else values[0]
+
+
+# unlike the others, nested MeanAxis nodes aren't equivalent to a single mean, so this never replaces them
+class MeanOfAxes(NaryAxis):
+    def combine_all(self, values: list[float]) -> float:
+        return reduce(operator.add, values) / len(values)
+
+    def combine_all_expression(self, values: list[str]) -> Optional[str]:
+        return f"({' + '.join(values)}) / {len(values)}"
+
+
+class InvertedAxis(AxisMutator):
     def generate_output(self, inputs: dict[str, Any]) -> float:
         return -1 * inputs['parent_axis']  # type: ignore
 
+    def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return f"-1 * {inputs['parent_axis']}"
+
+    def affine_form(self) -> Optional[tuple[float, float]]:
+        return -1.0, 0.0
+
 
 class MeanAxis(PairAxis):
     def combine_states(self, axis_a: float, axis_b: float) -> float:
         return (axis_a + axis_b) / 2
+
+    def combine_expression(self, axis_a: str, axis_b: str) -> Optional[str]:
+        return f"({axis_a} + {axis_b}) / 2"
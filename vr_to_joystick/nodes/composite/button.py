@@ -1,5 +1,7 @@
 from abc import abstractmethod
-from typing import Any
+from functools import reduce
+import operator
+from typing import Any, Optional
 
 from vr_to_joystick.nodes.types import BaseButton, Button, ButtonState
 
@@ -7,6 +9,7 @@ from vr_to_joystick.nodes.types import BaseButton, Button, ButtonState
 # Toggles between reporting the status of two buttons depending on the status of a third button
 class SwitchButton(BaseButton):
     requirements = {'switch_button', 'off_button', 'on_button'}
+    branch_dependencies = frozenset({'off_button', 'on_button'})
     dependencies: dict[str, Button]
 
     def __init__(self, switch_button: Button, off_button: Button, on_button: Button):
@@ -21,6 +24,21 @@ class SwitchButton(BaseButton):
             return inputs['on_button']['active']
         return inputs['off_button']['active']
 
+    def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return (
+            f"({inputs['on_button']}['active'] if {inputs['switch_button']}['active'] "
+            f"else {inputs['off_button']}['active'])"
+        )
+
+    def branch_selected(self, key: str, inputs: dict[str, Any]) -> bool:
+        return inputs['switch_button']['active'] == (key == 'on_button')  # type: ignore
+
+    def branch_condition(self, key: str, inputs: dict[str, str]) -> Optional[str]:
+        if key == 'on_button':
+            return f"{inputs['switch_button']}['active']"
+
+        return f"not {inputs['switch_button']}['active']"
+
 
 class PairButton(BaseButton):
     requirements = {'button_a', 'button_b'}
@@ -35,6 +53,13 @@ class PairButton(BaseButton):
     def get_button_state_this_tick(self, inputs: dict[str, Any]) -> bool:
         return self.combine_states(inputs['button_a'], inputs['button_b'])
 
+    # expression equivalent to combine_states, for compiled kernels. Stateful combinations leave this as None.
+    def combine_expression(self, button_a: str, button_b: str) -> Optional[str]:
+        return None
+
+    def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return self.combine_expression(inputs['button_a'], inputs['button_b'])
+
 # Button that turns on when both buttons are active, but doesn't turn off
 # until both buttons turn off.
 
@@ -59,16 +84,83 @@ class AndButton(PairButton):
     def combine_states(self, button_a: ButtonState, button_b: ButtonState) -> bool:
         return button_a['active'] and button_b['active']
 
+    def combine_expression(self, button_a: str, button_b: str) -> Optional[str]:
+        return f"({button_a}['active'] and {button_b}['active'])"
+
 
 class OrButton(PairButton):
     def combine_states(self, button_a: ButtonState, button_b: ButtonState) -> bool:
         return button_a['active'] or button_b['active']
 
+    def combine_expression(self, button_a: str, button_b: str) -> Optional[str]:
+        return f"({button_a}['active'] or {button_b}['active'])"
+
 
 class XorButton(PairButton):
     def combine_states(self, button_a: ButtonState, button_b: ButtonState) -> bool:
         return button_a['active'] ^ button_b['active']
 
+    def combine_expression(self, button_a: str, button_b: str) -> Optional[str]:
+        return f"({button_a}['active'] ^ {button_b}['active'])"
+
+
+# Combines any number of buttons with the same associative operation in a single node, e.g. AllButton(a, b, c)
+# rather than AndButton(AndButton(a, b), c). Dependencies are keyed button_0, button_1, ... in the order given.
+class NaryButton(BaseButton):
+    # the pairwise buttons that nest into this one, for the optimizer's flattening pass
+    flattens: tuple[type[PairButton], ...] = ()
+
+    def __init__(self, *buttons: Button):
+        if not buttons:
+            raise ValueError(f"{self.__class__.__name__} needs at least one button to combine!")
+
+        super().__init__(dependencies={f'button_{index}': button for index, button in enumerate(buttons)})
+
+    @abstractmethod
+    def combine_all(self, states: list[bool]) -> bool:
+        pass
+
+    def get_button_state_this_tick(self, inputs: dict[str, Any]) -> bool:
+        return self.combine_all([state['active'] for state in inputs.values()])
+
+    # expression equivalent to combine_all, for compiled kernels
+    def combine_all_expression(self, states: list[str]) -> Optional[str]:
+        return None
+
+    def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return self.combine_all_expression([f"{inputs[key]}['active']" for key in self.dependencies])
+
+
+class AllButton(NaryButton):
+    flattens = (AndButton,)
+
+    def combine_all(self, states: list[bool]) -> bool:
+        return all(states)
+
+    def combine_all_expression(self, states: list[str]) -> Optional[str]:
+        return f"({' and '.join(states)})"
+
+
+class AnyButton(NaryButton):
+    flattens = (OrButton,)
+
+    def combine_all(self, states: list[bool]) -> bool:
+        return any(states)
+
+    def combine_all_expression(self, states: list[str]) -> Optional[str]:
+        return f"({' or '.join(states)})"
+
+
+# active when an odd number of its buttons are
+class ParityButton(NaryButton):
+    flattens = (XorButton,)
+
+    def combine_all(self, states: list[bool]) -> bool:
+        return reduce(operator.xor, states)
+
+    def combine_all_expression(self, states: list[str]) -> Optional[str]:
+        return f"({' ^ '.join(states)})"
+
 
 class NotButton(BaseButton):
     requirements = {'parent_button'}
@@ -78,3 +170,6 @@ class NotButton(BaseButton):
 
     def get_button_state_this_tick(self, inputs: dict[str, Any]) -> bool:
         return not inputs['parent_button']['active']
+
+    def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return f"not {inputs['parent_button']}['active']"
@@ -1,6 +1,7 @@
-from typing import Any
+from typing import Any, Optional
 
 from vr_to_joystick.nodes.types import Axis
+from vr_to_joystick.nodes.value_generator import kernel_literal
 
 
 # n.b. for consistency's sake, we may want this to still follow the class factory pattern
@@ -13,3 +14,6 @@ class ConstantAxis(Axis):
 
     def generate_output(self, _: Any) -> float:
         return self.value
+
+    def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return kernel_literal(self.value)
@@ -1,5 +1,5 @@
 import time
-from typing import Any
+from typing import Any, Optional
 
 from vr_to_joystick.nodes.types import BaseButton
 
@@ -8,11 +8,17 @@ class AlwaysOffButton(BaseButton):
     def get_button_state_this_tick(self, _: Any) -> bool:
         return False
 
+    def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return 'False'
+
 
 class AlwaysOnButton(BaseButton):
     def get_button_state_this_tick(self, _: Any) -> bool:
         return True
 
+    def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return 'True'
+
 
 # Button turns off for one tick every time the configured interval elapses.
 # Useful for gestures that are always listening, to allow the gesture to turn back off.
@@ -32,3 +38,7 @@ class FlickeringButton(BaseButton):
             return False
 
         return True
+
+    # depends on the clock rather than on any input
+    def needs_tick(self) -> bool:
+        return True
@@ -1,19 +1,22 @@
 from typing import Any, Hashable
 
-from openvr import VRSystem
-
 from vr_to_joystick.nodes.types import Button, ButtonTickState
 from vr_to_joystick.nodes.value_generator import ValueConsumer
+from vr_to_joystick.nodes.vr_system_state import VrSystemState
 
 
 class HapticPulse(ValueConsumer):
     requirements = {'parent_button'}
 
-    def __init__(self, vr_system: VRSystem, parent_button: Button):
+    last_tick_state: ButtonTickState
+
+    def __init__(self, vr_system: VrSystemState, parent_button: Button):
         super().__init__(dependencies={'parent_button': parent_button})
         self.vr_system = vr_system
+        self.last_tick_state = 'inactive'
 
 
+# pulses the device in slot controller_id (see VrSystemState), wherever that device currently is
 def HapticPulseTrigger(controller_id: int, pulse_events: set[ButtonTickState],
                        duration_mcs: int = 1000) -> type[HapticPulse]:
     class _ConfiguredHapticPulseTrigger(HapticPulse):
@@ -22,7 +25,12 @@ def HapticPulseTrigger(controller_id: int, pulse_events: set[ButtonTickState],
             return [controller_id, tuple(pulse_events)]
 
         def update_with_inputs(self, inputs: dict[str, Any]) -> None:
-            if inputs['parent_button']['tick_state'] in pulse_events:
-                self.vr_system.triggerHapticPulse(controller_id, 0, duration_mcs)
+            self.last_tick_state = inputs['parent_button']['tick_state']
+            if self.last_tick_state in pulse_events:
+                self.vr_system.trigger_haptic_pulse(self.vr_system.device_slots[controller_id], duration_mcs)
+
+        # pulsing on a steady state like 'active' repeats every tick for as long as the button stays in that state
+        def needs_tick(self) -> bool:
+            return self.last_tick_state in pulse_events
 
     return _ConfiguredHapticPulseTrigger
@@ -12,6 +12,6 @@ def Flick(threshold: float) -> type[Button]:
             return [threshold]
 
         def get_button_state_this_tick(self, inputs: dict[str, Any]) -> bool:
-            return max(abs(v) for v in inputs['base_state']['velocity']) > threshold
+            return max(abs(float(v)) for v in inputs['base_state']['velocity']) > threshold
 
     return _ConfiguredFlick
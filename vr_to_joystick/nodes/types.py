@@ -1,5 +1,5 @@
 from abc import abstractmethod
-from typing import Any, Literal, TypedDict
+from typing import Any, Literal, Optional, TypedDict
 
 from vr_to_joystick.nodes.value_generator import ValueGenerator
 
@@ -28,6 +28,20 @@ TICK_STATE_MAPPING: dict[tuple[bool, bool], ButtonTickState] = {
     (True, True): 'active',
 }
 
+TRANSITIONAL_TICK_STATES: set[ButtonTickState] = {'just_pressed', 'just_unpressed'}
+
+# Tick states as small integers, for code that keeps button values in flat buffers rather than ButtonState dicts.
+# A button's code is (previous state * 2 + current state), so the low bit is whether the button is active.
+TICK_STATE_CODES: dict[ButtonTickState, int] = {
+    tick_state: int(previous) * 2 + int(current) for (previous, current), tick_state in TICK_STATE_MAPPING.items()
+}
+
+# every ButtonState a button can produce, indexed by tick state code. These are shared, so never modify one.
+BUTTON_STATES: tuple[ButtonState, ...] = tuple(
+    ButtonState(active=bool(code & 1), tick_state=TICK_STATE_MAPPING[(bool(code >> 1), bool(code & 1))])
+    for code in range(4)
+)
+
 
 class BaseButton(Button):
     state: bool
@@ -44,11 +58,19 @@ class BaseButton(Button):
     def get_button_state_this_tick(self, inputs: dict[str, Any]) -> bool:
         pass
 
+    # Like ValueGenerator.kernel_expression, but for get_button_state_this_tick. The compiled kernel tracks the
+    # previous state and the resulting tick state itself, so buttons whose new state only depends on their inputs
+    # can be inlined even though BaseButton is stateful.
+    def kernel_state_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return None
+
     def generate_output(self, inputs: dict[str, Any]) -> ButtonState:
-        new_state = self.get_button_state_this_tick(inputs)
+        code = (2 if self.state else 0) + (1 if self.get_button_state_this_tick(inputs) else 0)
 
-        tick_state = TICK_STATE_MAPPING[(self.state, new_state)]
+        self.state = bool(code & 1)
 
-        self.state = new_state
+        return BUTTON_STATES[code]
 
-        return ButtonState(active=new_state, tick_state=tick_state)
+    # a button that just changed reports a steady state next tick even if its inputs don't change again
+    def needs_tick(self) -> bool:
+        return self.current_value['tick_state'] in TRANSITIONAL_TICK_STATES
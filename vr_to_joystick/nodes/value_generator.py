@@ -1,16 +1,32 @@
 from __future__ import annotations
 from abc import abstractmethod
-from typing import Any, Hashable, TypeVar, Generic
+import math
+from typing import Any, Hashable, Optional, TypeVar, Generic
 
 from vr_to_joystick.nodes.multiton import MultitonNode
 
 O = TypeVar('O')
 
 
+# Python source for a constant, for nodes inlining their configuration into a compiled kernel
+def kernel_literal(value: Any) -> str:
+    if isinstance(value, float) and not math.isfinite(value):
+        return f"float('{value}')"
+
+    return repr(value)
+
+
 # todo add guard for current_value not being up to date when update called
 class ValueConsumer(metaclass=MultitonNode):
     requirements: set[str] = set()
     dependencies: dict[str, ValueGenerator[Any]]
+    # Dependencies that are only read under some condition, like the two sides of a switch. Processors that evaluate
+    # lazily skip anything that only feeds branches branch_selected rejects this tick. Nodes in a skipped branch are
+    # frozen rather than reset: they keep their state and last value, and on the next tick their branch is selected
+    # they update once against the inputs at that point, as if the ticks in between never happened. A button pressed
+    # while its branch was skipped reports just_pressed on resume, for instance, and anything timing itself against
+    # the clock sees the whole gap at once.
+    branch_dependencies: frozenset[str] = frozenset()
 
     def __init__(
         self,
@@ -57,12 +73,36 @@ class ValueConsumer(metaclass=MultitonNode):
                 f"Missing bindings: {', '.join(missing_requirements)}"
             )
 
+    # Points one of this node's dependencies at a different generator, for graph passes that swap a subgraph for an
+    # equivalent one. Callers must make sure the replacement always produces the same value as what it replaces.
+    def rebind_dependency(self, key: str, generator: ValueGenerator[Any]) -> None:
+        previous_generator = self.dependencies[key]
+        # copy rather than mutate, since nodes without dependencies share the default dict
+        self.dependencies = {**self.dependencies, key: generator}
+        previous_generator.bound_children.remove(self)
+        generator.bind_child(self)
+
+    # whether the branch dependency under key is read this tick, given the current values of every dependency that
+    # isn't a branch
+    def branch_selected(self, key: str, inputs: dict[str, Any]) -> bool:
+        return True
+
+    # expression equivalent to branch_selected, for compiled kernels. None means the branch is always evaluated.
+    def branch_condition(self, key: str, inputs: dict[str, str]) -> Optional[str]:
+        return None
+
     def dependencies_updated_for_tick(self, tick_index: int) -> bool:
         return all(binding.updated_for_tick(tick_index) for binding in self.dependencies.values())
 
     def updated_for_tick(self, tick_index: int) -> bool:
         return self.last_tick_update == tick_index
 
+    # Checked after each update by processors that skip nodes whose inputs haven't changed. Return True if this node
+    # must be updated again next tick even when none of its inputs change, e.g. because it reads the clock or is part
+    # way through a state transition that only completes on the following tick.
+    def needs_tick(self) -> bool:
+        return False
+
     def update(self, tick_index: int) -> None:
         inputs = {key: generator.current_value for key, generator in self.dependencies.items()}
 
@@ -77,6 +117,8 @@ class ValueConsumer(metaclass=MultitonNode):
 
 class ValueGenerator(Generic[O], ValueConsumer):
     current_value: O
+    # set for generators that produce a fresh value on every update, so comparing against the previous value is wasted
+    changes_every_tick: bool = False
 
     def __init__(self, *args: Any, **kwargs: Any):
         super().__init__(*args, **kwargs)
@@ -88,6 +130,13 @@ class ValueGenerator(Generic[O], ValueConsumer):
     def update_with_inputs(self, inputs: dict[str, Any]) -> None:
         self.current_value = self.generate_output(inputs)
 
+    # Source for a Python expression computing the same value as generate_output, for compiling the graph into a
+    # single function. Inputs are expressions for each dependency's value, keyed like the dependencies themselves.
+    # Nodes that keep state between ticks or do anything beyond simple math return None, and the compiled kernel
+    # calls generate_output on them instead.
+    def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        return None
+
     @abstractmethod
     def generate_output(self, inputs: dict[str, Any]) -> O:
         pass
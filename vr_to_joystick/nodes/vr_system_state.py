@@ -1,9 +1,17 @@
-from collections import defaultdict
-from typing import Any, Callable, Hashable, Iterable, Literal, TypeVar, TypedDict
-
+from collections import defaultdict, deque
+import ctypes
+import logging
+import time
+from typing import Any, Callable, Hashable, Literal, NamedTuple, Optional, TypeVar, TypedDict
+
+import numpy as np
+import numpy.typing as npt
 import openvr
 
-from vr_to_joystick.nodes.value_generator import ValueGenerator
+from vr_to_joystick.nodes.types import ButtonEventType
+from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+
+logger = logging.getLogger(__name__)
 
 DeviceClass = Literal['controller', 'generic_tracker', 'hmd']
 
@@ -22,36 +30,190 @@ CONTROLLER_ROLE_NAME_TO_SUPPORTED_OPENVR_CONSTANTS: dict[ControllerRole, int] =
 }
 
 
-class ControllerButtonStatePackage(TypedDict):
-    touched: dict[int, bool]
-    pressed: dict[int, bool]
+# NumPy layout of openvr.TrackedDevicePose_t, for reading the pose array openvr fills in without going through ctypes
+TRACKED_DEVICE_POSE_DTYPE = np.dtype({
+    'names': ['pose', 'velocity', 'angular_velocity', 'tracking_result', 'pose_is_valid', 'device_is_connected'],
+    'formats': [('<f4', (3, 4)), ('<f4', (3,)), ('<f4', (3,)), '<u4', '?', '?'],
+    'offsets': [
+        openvr.TrackedDevicePose_t.mDeviceToAbsoluteTracking.offset,
+        openvr.TrackedDevicePose_t.vVelocity.offset,
+        openvr.TrackedDevicePose_t.vAngularVelocity.offset,
+        openvr.TrackedDevicePose_t.eTrackingResult.offset,
+        openvr.TrackedDevicePose_t.bPoseIsValid.offset,
+        openvr.TrackedDevicePose_t.bDeviceIsConnected.offset,
+    ],
+    'itemsize': ctypes.sizeof(openvr.TrackedDevicePose_t),
+})
+
+# Views over a single device's slice of the pose buffer, which are float32, or of a pose derived from it, which are
+# float64. Reading one element gives a NumPy float, so convert with float() before doing arithmetic on it, or the
+# result may stay in single precision.
+PoseMatrix = npt.NDArray[np.floating[Any]]  # 3x4 device-to-absolute-tracking transform
+PoseVector = npt.NDArray[np.floating[Any]]  # 3-vector
+# Double precision views over a single device's slice of the decomposed poses (see PoseDecomposition)
+DecomposedPoseMatrix = npt.NDArray[np.float64]
+DecomposedPoseVector = npt.NDArray[np.float64]
+
+
+# Where button state comes from: the button events queued by openvr, or the pressed and touched masks in each
+# device's controller state, which is fetched every tick anyway
+ButtonSource = Literal['events', 'controller_state']
+
+
+# A button changing state, as reported by a button event. The timestamp is on the time.monotonic() clock.
+class ButtonTransition(NamedTuple):
+    timestamp: float
+    device_index: int
+    event_type: ButtonEventType
+    button_id: int
+    active: bool
+
+
+BUTTON_EVENT_TRANSITIONS: dict[int, tuple[ButtonEventType, bool]] = {
+    openvr.VREvent_ButtonTouch: ('touch', True),
+    openvr.VREvent_ButtonUntouch: ('touch', False),
+    openvr.VREvent_ButtonPress: ('press', True),
+    openvr.VREvent_ButtonUnpress: ('press', False),
+}
+
+# events after which devices may have moved to a different index
+DEVICE_EVENTS = {
+    openvr.VREvent_TrackedDeviceActivated,
+    openvr.VREvent_TrackedDeviceDeactivated,
+    openvr.VREvent_TrackedDeviceRoleChanged,
+}
 
 
 class ControllerStatePackage(TypedDict):
-    pose: openvr.HmdMatrix34_t
-    velocity: openvr.HmdVector3_t
-    angular_velocity: openvr.HmdVector3_t
+    pose: PoseMatrix
+    velocity: PoseVector
+    angular_velocity: PoseVector
+    # yaw, pitch and roll, in radians
+    euler: DecomposedPoseVector
+    translation: DecomposedPoseVector
+    # pose in the HMD's frame of reference
+    hmd_relative_pose: DecomposedPoseMatrix
     controller_state: openvr.VRControllerState_t
-    button_state: ControllerButtonStatePackage
+    # bit n is set while button n is pressed/touched
+    buttons_pressed: int
+    buttons_touched: int
 
 
 class VrSystemStatePackage(TypedDict):
-    poses: dict[int, Iterable[openvr.TrackedDevicePose_t]]
+    # every device's pose, as a structured array of TRACKED_DEVICE_POSE_DTYPE
+    poses: npt.NDArray[np.void]
+    # per-device views into poses, indexed by device
+    pose_matrices: list[PoseMatrix]
+    velocities: list[PoseVector]
+    angular_velocities: list[PoseVector]
+    # the same, as predicted VrSystemState.prediction_seconds ahead, and only fetched while predicts_poses is set
+    predicted_poses: npt.NDArray[np.void]
+    predicted_pose_matrices: list[PoseMatrix]
+    predicted_velocities: list[PoseVector]
+    predicted_angular_velocities: list[PoseVector]
     controller_state: dict[int, openvr.VRControllerState_t]
-    button_state: dict[int, ControllerButtonStatePackage]
-
-
+    # button masks, indexed by device slot
+    buttons_pressed: list[int]
+    buttons_touched: list[int]
+    # the transitions applied to the button masks this tick, oldest first. Always empty unless buttons come from events.
+    button_transitions: list[ButtonTransition]
+
+
+class PoseDecompositionPackage(TypedDict):
+    # per-device views, indexed by device
+    euler: list[DecomposedPoseVector]
+    translations: list[DecomposedPoseVector]
+    hmd_relative_poses: list[DecomposedPoseMatrix]
+    # only kept up to date while PoseDecomposition.decomposes_hmd_relative_motion is set
+    hmd_relative_euler: list[DecomposedPoseVector]
+    hmd_relative_translations: list[DecomposedPoseVector]
+    hmd_relative_velocities: list[DecomposedPoseVector]
+    hmd_relative_angular_velocities: list[DecomposedPoseVector]
+
+
+# Consumers read devices through slots rather than straight from device indexes. Slot n starts out reading device n,
+# but a slot handed out by track_device follows its device by class and role: when openvr reports devices being
+# (de)activated or changing role, tracked slots are re-pointed at wherever their device is now. Everything the root
+# hands out per device is indexed by slot, so a controller that reconnects under a new index keeps feeding the same
+# nodes, with all their state, without the graph or a compiled kernel being rebuilt.
 class VrSystemState(ValueGenerator[VrSystemStatePackage]):
-    def __init__(self, vr_system: openvr.IVRSystem):
+    changes_every_tick = True
+
+    def __init__(self, vr_system: openvr.IVRSystem, button_source: ButtonSource = 'controller_state'):
         super().__init__()
         self.vr_system = vr_system
-        self.buttons_pressed: dict[int, dict[int, bool]] = defaultdict(lambda: defaultdict(bool))
-        self.buttons_touched: dict[int, dict[int, bool]] = defaultdict(lambda: defaultdict(bool))
+        self.button_source = button_source
+        # updated in place, so the same lists are handed out every tick
+        self.buttons_pressed: list[int] = [0] * openvr.k_unMaxTrackedDeviceCount
+        self.buttons_touched: list[int] = [0] * openvr.k_unMaxTrackedDeviceCount
+        # button masks built up from events, by device index rather than slot
+        self.device_buttons_pressed: list[int] = [0] * openvr.k_unMaxTrackedDeviceCount
+        self.device_buttons_touched: list[int] = [0] * openvr.k_unMaxTrackedDeviceCount
+        # button events read from openvr but not applied to the masks yet, and those applied this tick
+        self.pending_button_transitions: deque[ButtonTransition] = deque()
+        self.button_transitions: list[ButtonTransition] = []
 
         # index 1: pose class (i.e. HMD vs Controller)
         # index 2: object role (e.g. left vs right hand. if N/A, role is always 0)
         self.device_indexes: dict[int, dict[int, int]] = defaultdict(dict)
         self.load_devices_by_index()
+        # the device index each slot reads, and the device each tracked slot follows
+        self.device_slots: list[int] = list(range(openvr.k_unMaxTrackedDeviceCount))
+        self.tracked_devices: dict[int, tuple[DeviceClass, ControllerRole]] = {}
+        # slots whose controller state is fetched each tick, kept up to date as consumers are bound to this node and
+        # replaced with a new list whenever that or the device behind a slot changes
+        self.polled_device_indexes: list[int] = []
+        # the controller state of each polled slot, as last fetched
+        self.controller_states: dict[int, openvr.VRControllerState_t] = {}
+
+        # openvr writes every device's pose into this same buffer each tick, and everything downstream reads it
+        # through NumPy views over that memory, set up once here
+        self.pose_buffer = (openvr.TrackedDevicePose_t * openvr.k_unMaxTrackedDeviceCount)()
+        self.poses: npt.NDArray[np.void] = np.frombuffer(self.pose_buffer, dtype=TRACKED_DEVICE_POSE_DTYPE)
+        self.pose_matrices: list[PoseMatrix] = list(self.poses['pose'])
+        self.velocities: list[PoseVector] = list(self.poses['velocity'])
+        self.angular_velocities: list[PoseVector] = list(self.poses['angular_velocity'])
+        # Poses as openvr predicts they'll be prediction_seconds from now, to make up for the time between poses being
+        # fetched and outputs reaching the game, filled into a second buffer of their own. Fetching them costs a second
+        # call to openvr each tick, so they're only fetched once something reads them (see PredictedPoseDecomposition).
+        self.prediction_seconds = 0.0
+        self.predicts_poses = False
+        self.predicted_pose_buffer = (openvr.TrackedDevicePose_t * openvr.k_unMaxTrackedDeviceCount)()
+        self.predicted_poses: npt.NDArray[np.void] = np.frombuffer(
+            self.predicted_pose_buffer, dtype=TRACKED_DEVICE_POSE_DTYPE)
+        self.predicted_pose_matrices: list[PoseMatrix] = list(self.predicted_poses['pose'])
+        self.predicted_velocities: list[PoseVector] = list(self.predicted_poses['velocity'])
+        self.predicted_angular_velocities: list[PoseVector] = list(self.predicted_poses['angular_velocity'])
+        # time.perf_counter() as of the last time poses were fetched, for measuring how long they take to reach outputs
+        self.poses_fetched_at = 0.0
+        # Haptic pulses go straight to openvr, unless something else takes them on, e.g. an output thread sending them
+        # along with the outputs, so the tick doesn't wait on them. Called with a device index and a duration in us.
+        self.haptic_pulse_sink: Optional[Callable[[int, int], None]] = None
+
+    # pulses the device at device_index for duration_mcs microseconds
+    def trigger_haptic_pulse(self, device_index: int, duration_mcs: int) -> None:
+        if self.haptic_pulse_sink is None:
+            self.vr_system.triggerHapticPulse(device_index, 0, duration_mcs)
+        else:
+            self.haptic_pulse_sink(device_index, duration_mcs)
+
+    def bind_child(self, child: ValueConsumer) -> None:
+        super().bind_child(child)
+        self.refresh_polled_devices()
+
+    # Controller state is fetched one device at a time, so only the devices that consumers actually read are polled.
+    # A consumer that doesn't read from a single known device could read any of them, so all devices get polled.
+    def refresh_polled_devices(self) -> None:
+        device_indexes: set[int] = set()
+        for child in self.bound_children:
+            if isinstance(child, VrSystemStateConsumer) and not child.reads_controller_state:
+                continue
+            if not isinstance(child, VrSystemStateConsumer) or child.device_index is None:
+                self.polled_device_indexes = list(range(openvr.k_unMaxTrackedDeviceCount))
+                return
+            device_indexes.add(child.device_index)
+
+        self.polled_device_indexes = sorted(device_indexes)
 
     def load_devices_by_index(self) -> None:
         self.device_indexes.clear()
@@ -60,6 +222,43 @@ class VrSystemState(ValueGenerator[VrSystemStatePackage]):
             self.device_indexes[self.vr_system.getTrackedDeviceClass(
                 i)][self.vr_system.getControllerRoleForTrackedDeviceIndex(i)] = i
 
+    # the slot following the device of the given class and role, which for now is the device's own index
+    def track_device(self, device_class: DeviceClass, controller_role: ControllerRole = 'no_role') -> int:
+        slot = self.device_id_for_type(device_class, controller_role)
+        self.tracked_devices[slot] = (device_class, controller_role)
+
+        return slot
+
+    def _point_slot(self, slot: int, device_index: int) -> None:
+        self.device_slots[slot] = device_index
+        self.pose_matrices[slot] = self.poses['pose'][device_index]
+        self.velocities[slot] = self.poses['velocity'][device_index]
+        self.angular_velocities[slot] = self.poses['angular_velocity'][device_index]
+        self.predicted_pose_matrices[slot] = self.predicted_poses['pose'][device_index]
+        self.predicted_velocities[slot] = self.predicted_poses['velocity'][device_index]
+        self.predicted_angular_velocities[slot] = self.predicted_poses['angular_velocity'][device_index]
+
+    # reloads which device is at which index, and re-points any tracked slot whose device has moved
+    def refresh_devices(self) -> None:
+        self.load_devices_by_index()
+
+        repointed = False
+        for slot, (device_class, controller_role) in self.tracked_devices.items():
+            try:
+                device_index = self.device_id_for_type(device_class, controller_role)
+            except IndexError:
+                # keep reading the last known index until the device comes back
+                logger.warning(f"Lost device {device_class}.{controller_role}")
+                continue
+
+            if device_index != self.device_slots[slot]:
+                logger.info(f"Device {device_class}.{controller_role} moved to index {device_index}")
+                self._point_slot(slot, device_index)
+                repointed = True
+
+        if repointed:
+            self.refresh_polled_devices()
+
     def device_id_for_type(self, device_class: DeviceClass, controller_role: ControllerRole = 'no_role') -> int:
         device_class_constant = DEVICE_CLASS_NAME_TO_SUPPORTED_OPENVR_CONSTANTS[device_class]
         controller_role_constant = CONTROLLER_ROLE_NAME_TO_SUPPORTED_OPENVR_CONSTANTS[controller_role]
@@ -68,54 +267,122 @@ class VrSystemState(ValueGenerator[VrSystemStatePackage]):
         except KeyError:
             raise IndexError(f"No controller found for specified class '{device_class}' and role '{controller_role}'")
 
-    def _poll_button_events(self) -> None:
+    # Drains openvr's event queue, queueing button transitions if buttons come from events and refreshing devices if
+    # any were (de)activated or changed role. Called every tick, and while waiting for devices to show up.
+    def poll_events(self) -> None:
+        polled_at = time.monotonic()
+        devices_changed = False
         event = openvr.VREvent_t()
         while self.vr_system.pollNextEvent(event):
-            if event.eventType == openvr.VREvent_ButtonTouch:
-                print(f"Touch: {event.trackedDeviceIndex}, {event.data.controller.button}")
-                self.buttons_touched[event.trackedDeviceIndex][event.data.controller.button] = True
-            elif event.eventType == openvr.VREvent_ButtonUntouch:
-                self.buttons_touched[event.trackedDeviceIndex][event.data.controller.button] = False
-            elif event.eventType == openvr.VREvent_ButtonPress:
-                print(f"Press: {event.trackedDeviceIndex}, {event.data.controller.button}")
-                self.buttons_pressed[event.trackedDeviceIndex][event.data.controller.button] = True
-            elif event.eventType == openvr.VREvent_ButtonUnpress:
-                self.buttons_pressed[event.trackedDeviceIndex][event.data.controller.button] = False
-
-    def _button_state_package(self) -> dict[int, ControllerButtonStatePackage]:
-        controller_ids = set(self.buttons_pressed.keys()) | set(self.buttons_touched.keys())
-        result: dict[int, ControllerButtonStatePackage] = defaultdict(
-            lambda: ControllerButtonStatePackage(touched=defaultdict(bool), pressed=defaultdict(bool)))
-        for controller_id in controller_ids:
-            result[controller_id] = ControllerButtonStatePackage(
-                touched=self.buttons_touched[controller_id],
-                pressed=self.buttons_pressed[controller_id]
-            )
-
-        return result
-
-    def _fetch_poses(self) -> dict[int, Iterable[openvr.TrackedDevicePose_t]]:
-        # C-style array declaration: one device pose object per device being tracked
-        # let it be known that i hate this
-        poses_t = openvr.TrackedDevicePose_t * openvr.k_unMaxTrackedDeviceCount
-        poses = poses_t()
-        self.vr_system.getDeviceToAbsoluteTrackingPose(openvr.TrackingUniverseSeated, 0, poses)
-
-        return poses  # type: ignore
+            if event.eventType in DEVICE_EVENTS:
+                devices_changed = True
+                continue
+
+            transition = BUTTON_EVENT_TRANSITIONS.get(event.eventType)
+            if transition is None or self.button_source != 'events':
+                continue
+
+            event_type, active = transition
+            self.pending_button_transitions.append(ButtonTransition(
+                polled_at - event.eventAgeSeconds,
+                event.trackedDeviceIndex,
+                event_type,
+                event.data.controller.button,
+                active,
+            ))
+
+        if devices_changed:
+            self.refresh_devices()
+
+    # Applies pending transitions to the button masks, at most one per button per tick. A button pressed and released
+    # between two ticks would otherwise look like it never changed, so the release is held back for the next tick,
+    # and everything downstream sees both edges. Once a button has a transition held back, any later ones for it are
+    # too, so they're always applied in order.
+    def _apply_button_transitions(self) -> None:
+        if self.button_transitions:
+            self.button_transitions = []
+        if not self.pending_button_transitions:
+            return
+
+        changed_buttons: set[tuple[int, ButtonEventType, int]] = set()
+        held_back: deque[ButtonTransition] = deque()
+        for transition in self.pending_button_transitions:
+            button = (transition.device_index, transition.event_type, transition.button_id)
+            if button in changed_buttons:
+                held_back.append(transition)
+                continue
+
+            changed_buttons.add(button)
+            masks = self.device_buttons_pressed if transition.event_type == 'press' else self.device_buttons_touched
+            if transition.active:
+                masks[transition.device_index] |= 1 << transition.button_id
+            else:
+                masks[transition.device_index] &= ~(1 << transition.button_id)
+            self.button_transitions.append(transition)
+
+        self.pending_button_transitions = held_back
+
+    # refills the pose buffers in place, which updates every view over them
+    def _fetch_poses(self) -> None:
+        self.poses_fetched_at = time.perf_counter()
+        self.vr_system.getDeviceToAbsoluteTrackingPose(openvr.TrackingUniverseSeated, 0, self.pose_buffer)
+        if not self.predicts_poses:
+            return
+
+        if self.prediction_seconds > 0:
+            self.vr_system.getDeviceToAbsoluteTrackingPose(
+                openvr.TrackingUniverseSeated, self.prediction_seconds, self.predicted_pose_buffer)
+        else:
+            ctypes.memmove(self.predicted_pose_buffer, self.pose_buffer, ctypes.sizeof(self.pose_buffer))
 
     def _get_controller_states(self) -> dict[int, openvr.VRControllerState_t]:
-        return {
-            i: self.vr_system.getControllerState(i)[1]
-            for i in range(openvr.k_unMaxTrackedDeviceCount)
+        device_slots = self.device_slots
+        controller_states = {
+            slot: self.vr_system.getControllerState(device_slots[slot])[1]
+            for slot in self.polled_device_indexes
         }
+        if self.button_source == 'controller_state':
+            for slot, controller_state in controller_states.items():
+                self.buttons_pressed[slot] = controller_state.ulButtonPressed
+                self.buttons_touched[slot] = controller_state.ulButtonTouched
+        else:
+            for slot in self.polled_device_indexes:
+                self.buttons_pressed[slot] = self.device_buttons_pressed[device_slots[slot]]
+                self.buttons_touched[slot] = self.device_buttons_touched[device_slots[slot]]
+
+        self.controller_states = controller_states
+        return controller_states
+
+    # Fetches fresh poses and controller state, and queues any new button events, without running a tick. Button
+    # events aren't applied, so the next tick still sees every edge. Lets a runner check for activity between ticks.
+    def sample_inputs(self) -> None:
+        self.poll_events()
+        self._fetch_poses()
+        self._get_controller_states()
+
+    # the root of the graph is the source of all new input, so it's polled every tick
+    def needs_tick(self) -> bool:
+        return True
 
     def generate_output(self, _: Any) -> VrSystemStatePackage:
-        self._poll_button_events()
+        self.poll_events()
+        if self.button_source == 'events':
+            self._apply_button_transitions()
+        self._fetch_poses()
 
         return VrSystemStatePackage(
-            poses=self._fetch_poses(),
-            button_state=self._button_state_package(),
+            poses=self.poses,
+            pose_matrices=self.pose_matrices,
+            velocities=self.velocities,
+            angular_velocities=self.angular_velocities,
+            predicted_poses=self.predicted_poses,
+            predicted_pose_matrices=self.predicted_pose_matrices,
+            predicted_velocities=self.predicted_velocities,
+            predicted_angular_velocities=self.predicted_angular_velocities,
             controller_state=self._get_controller_states(),
+            buttons_pressed=self.buttons_pressed,
+            buttons_touched=self.buttons_touched,
+            button_transitions=self.button_transitions,
         )
 
 
@@ -124,32 +391,256 @@ O = TypeVar('O', bound=Hashable)
 
 class VrSystemStateConsumer(ValueGenerator[O]):
     requirements = {'base_state'}
+    changes_every_tick = True
+    # the one device slot this consumer reads the state of, if there is one
+    device_index: Optional[int] = None
+    # consumers that only read poses don't need any device's controller state polled
+    reads_controller_state: bool = True
+
+    def __init__(self, vr_system: VrSystemState, dependencies: dict[str, ValueGenerator[Any]] = {}):
+        super().__init__(dependencies={'base_state': vr_system, **dependencies})
+
+
+# yaw, pitch and roll of each of a stack of 3x4 poses, written into the columns of out
+def _euler_angles(matrices: npt.NDArray[np.float64], out: npt.NDArray[np.float64]) -> None:
+    np.arcsin(matrices[:, 2, 0], out=out[:, 0])
+    np.negative(out[:, 0], out=out[:, 0])
+    np.arctan2(matrices[:, 2, 1], matrices[:, 2, 2], out=out[:, 1])
+    np.arctan2(matrices[:, 1, 0], matrices[:, 0, 0], out=out[:, 2])
+
+
+# Breaks the pose of every polled device down into euler angles, translation and a pose relative to the HMD, in one
+# vectorized pass per tick, so nodes reading those only need to look them up. Results are written in place into
+# double precision arrays, reallocated only when the polled slots or the devices behind them change, and handed out
+# as per-slot views over them. Slots that aren't polled read as zeros. Without an HMD, HMD-relative poses are the same
+# as absolute ones.
+#
+# Euler angles and velocities relative to the HMD cost a few more operations per tick, so they're only worked out
+# once something reads them (see HmdRelativeControllerState).
+class PoseDecomposition(VrSystemStateConsumer[PoseDecompositionPackage]):
+    reads_controller_state = False
+    # which of the root's pose arrays this decomposes
+    pose_source: Literal['poses', 'predicted_poses'] = 'poses'
+
+    def __init__(self, vr_system: VrSystemState):
+        super().__init__(vr_system)
+        self.vr_system_state = vr_system
+        try:
+            self.hmd_slot: Optional[int] = vr_system.track_device('hmd')
+        except IndexError:
+            self.hmd_slot = None
+        self.decomposes_hmd_relative_motion = False
+
+        device_count = openvr.k_unMaxTrackedDeviceCount
+        self.unpolled_vector: DecomposedPoseVector = np.zeros(3)
+        self.unpolled_matrix: DecomposedPoseMatrix = np.zeros((3, 4))
+        self.package = PoseDecompositionPackage(
+            euler=[self.unpolled_vector] * device_count,
+            translations=[self.unpolled_vector] * device_count,
+            hmd_relative_poses=[self.unpolled_matrix] * device_count,
+            hmd_relative_euler=[self.unpolled_vector] * device_count,
+            hmd_relative_translations=[self.unpolled_vector] * device_count,
+            hmd_relative_velocities=[self.unpolled_vector] * device_count,
+            hmd_relative_angular_velocities=[self.unpolled_vector] * device_count,
+        )
+        self.decomposed_device_indexes: list[int] = []
+        self._allocate([])
+
+    # Lays out one row per slot, plus a last one for the HMD if there is one, and points each slot's views in the
+    # package at its row. Views over the HMD's row are taken here too, since slicing every tick costs about as much as
+    # the math itself.
+    def _allocate(self, device_indexes: list[int]) -> None:
+        self.decomposed_device_indexes = device_indexes
+        slots = device_indexes + ([] if self.hmd_slot is None else [self.hmd_slot])
+        device_slots = self.vr_system_state.device_slots
+        self.device_index_array = np.array([device_slots[slot] for slot in slots], dtype=np.intp)
+
+        row_count = len(self.device_index_array)
+        self.matrices = np.zeros((row_count, 3, 4))
+        self.velocities = np.zeros((row_count, 3))
+        self.angular_velocities = np.zeros((row_count, 3))
+        self.euler = np.zeros((row_count, 3))
+        self.translations = np.zeros((row_count, 3))
+        self.hmd_relative_poses = np.zeros((row_count, 3, 4))
+        self.hmd_relative_translations = self.hmd_relative_poses[:, :, 3]
+        self.hmd_relative_euler = np.zeros((row_count, 3))
+        self.hmd_relative_velocities = np.zeros((row_count, 3))
+        self.hmd_relative_angular_velocities = np.zeros((row_count, 3))
+        if self.hmd_slot is None:
+            self.hmd_rotation = np.eye(3)
+            self.hmd_relative_hmd_translation = np.zeros(3)
+            self.hmd_velocity = np.zeros(3)
+            self.hmd_angular_velocity = np.zeros(3)
+        else:
+            self.hmd_rotation = self.matrices[-1, :, :3]
+            self.hmd_relative_hmd_translation = self.hmd_relative_poses[-1, :, 3]
+            self.hmd_velocity = self.velocities[-1]
+            self.hmd_angular_velocity = self.angular_velocities[-1]
+
+        package_rows: list[tuple[list[npt.NDArray[np.float64]], npt.NDArray[np.float64], npt.NDArray[np.float64]]] = [
+            (self.package['euler'], self.euler, self.unpolled_vector),
+            (self.package['translations'], self.translations, self.unpolled_vector),
+            (self.package['hmd_relative_poses'], self.hmd_relative_poses, self.unpolled_matrix),
+            (self.package['hmd_relative_euler'], self.hmd_relative_euler, self.unpolled_vector),
+            (self.package['hmd_relative_translations'], self.hmd_relative_translations, self.unpolled_vector),
+            (self.package['hmd_relative_velocities'], self.hmd_relative_velocities, self.unpolled_vector),
+            (self.package['hmd_relative_angular_velocities'], self.hmd_relative_angular_velocities,
+             self.unpolled_vector),
+        ]
+        for views, rows, unpolled in package_rows:
+            views[:] = [unpolled] * openvr.k_unMaxTrackedDeviceCount
+            for row, device_index in enumerate(device_indexes):
+                views[device_index] = rows[row]
+
+    def generate_output(self, inputs: dict[str, Any]) -> PoseDecompositionPackage:
+        # the devices worth decomposing are the ones controller states are read from
+        if self.vr_system_state.polled_device_indexes is not self.decomposed_device_indexes:
+            self._allocate(self.vr_system_state.polled_device_indexes)
+
+        poses = inputs['base_state'][self.pose_source]
+        matrices = self.matrices
+        np.copyto(matrices, poses['pose'][self.device_index_array])
+
+        _euler_angles(matrices, self.euler)
+        np.copyto(self.translations, matrices[:, :, 3])
+
+        # the inverse of a rigid transform [R | t] is [R^T | -R^T t], so the HMD-relative pose of a device is
+        # R^T [R_device | t_device] - [0 | R^T t]
+        np.matmul(self.hmd_rotation.T, matrices, out=self.hmd_relative_poses)
+        np.subtract(self.hmd_relative_translations, self.hmd_relative_hmd_translation,
+                    out=self.hmd_relative_translations)
+
+        if self.decomposes_hmd_relative_motion:
+            _euler_angles(self.hmd_relative_poses, self.hmd_relative_euler)
+
+            # velocities are taken relative to the HMD's, then expressed along its axes. Multiplying row vectors by R
+            # is the same as multiplying column vectors by R^T.
+            np.copyto(self.velocities, poses['velocity'][self.device_index_array])
+            np.subtract(self.velocities, self.hmd_velocity, out=self.velocities)
+            np.matmul(self.velocities, self.hmd_rotation, out=self.hmd_relative_velocities)
+            np.copyto(self.angular_velocities, poses['angular_velocity'][self.device_index_array])
+            np.subtract(self.angular_velocities, self.hmd_angular_velocity, out=self.angular_velocities)
+            np.matmul(self.angular_velocities, self.hmd_rotation, out=self.hmd_relative_angular_velocities)
+
+        return self.package
+
+
+# The same breakdown of the poses openvr predicts for VrSystemState.prediction_seconds ahead, for nodes that have to
+# make up for latency, like steering. Poses are only predicted once one of these exists.
+class PredictedPoseDecomposition(PoseDecomposition):
+    pose_source = 'predicted_poses'
 
     def __init__(self, vr_system: VrSystemState):
-        super().__init__(dependencies={'base_state': vr_system})
+        super().__init__(vr_system)
+        vr_system.predicts_poses = True
+
+
+def _pose_decomposition(vr_system: VrSystemState, predicted: bool) -> PoseDecomposition:
+    return PredictedPoseDecomposition(vr_system) if predicted else PoseDecomposition(vr_system)
 
 
 ControllerStateGenerator = VrSystemStateConsumer[ControllerStatePackage]
 
 
-def ControllerState(controller_id: int) -> type[ControllerStateGenerator]:
+# The state of whichever device is in slot controller_id (see VrSystemState). Build these with ControllerStateByType
+# to follow a device by class and role as it reconnects. A predicted state reads the device's pose and velocities as
+# predicted VrSystemState.prediction_seconds ahead, while its buttons and axes are the same as ever.
+def ControllerState(controller_id: int, predicted: bool = False) -> type[ControllerStateGenerator]:
+    # prefix of the root's package fields the pose is read from
+    pose_prefix = 'predicted_' if predicted else ''
+
     class _ConfiguredControllerState(ControllerStateGenerator):
+        device_index = controller_id
+        requirements = {'base_state', 'decomposed_poses'}
+
+        def __init__(self, vr_system: VrSystemState):
+            super().__init__(vr_system, {'decomposed_poses': _pose_decomposition(vr_system, predicted)})
+
         @classmethod
         def _parameterized_on(cls) -> list[Hashable]:
-            return [controller_id]
+            return [controller_id, predicted]
 
         def generate_output(self, inputs: dict[str, Any]) -> ControllerStatePackage:
             return {
-                'pose': inputs['base_state']['poses'][controller_id].mDeviceToAbsoluteTracking,
-                'velocity': inputs['base_state']['poses'][controller_id].vVelocity,
-                'angular_velocity': inputs['base_state']['poses'][controller_id].vAngularVelocity,
-                'button_state': inputs['base_state']['button_state'][controller_id],
+                'pose': inputs['base_state'][f'{pose_prefix}pose_matrices'][controller_id],
+                'velocity': inputs['base_state'][f'{pose_prefix}velocities'][controller_id],
+                'angular_velocity': inputs['base_state'][f'{pose_prefix}angular_velocities'][controller_id],
+                'euler': inputs['decomposed_poses']['euler'][controller_id],
+                'translation': inputs['decomposed_poses']['translations'][controller_id],
+                'hmd_relative_pose': inputs['decomposed_poses']['hmd_relative_poses'][controller_id],
                 'controller_state': inputs['base_state']['controller_state'][controller_id],
+                'buttons_pressed': inputs['base_state']['buttons_pressed'][controller_id],
+                'buttons_touched': inputs['base_state']['buttons_touched'][controller_id],
             }
 
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            base_state = inputs['base_state']
+            decomposed_poses = inputs['decomposed_poses']
+            return (
+                f"{{'pose': {base_state}['{pose_prefix}pose_matrices'][{controller_id}], "
+                f"'velocity': {base_state}['{pose_prefix}velocities'][{controller_id}], "
+                f"'angular_velocity': {base_state}['{pose_prefix}angular_velocities'][{controller_id}], "
+                f"'euler': {decomposed_poses}['euler'][{controller_id}], "
+                f"'translation': {decomposed_poses}['translations'][{controller_id}], "
+                f"'hmd_relative_pose': {decomposed_poses}['hmd_relative_poses'][{controller_id}], "
+                f"'controller_state': {base_state}['controller_state'][{controller_id}], "
+                f"'buttons_pressed': {base_state}['buttons_pressed'][{controller_id}], "
+                f"'buttons_touched': {base_state}['buttons_touched'][{controller_id}]}}"
+            )
+
     return _ConfiguredControllerState
 
 
+# A device's state in the HMD's frame of reference, rather than the tracking space's: its pose, translation and angles
+# are relative to the HMD's pose, and its velocities relative to the HMD's, along the HMD's axes. Anything reading a
+# controller state can read one of these instead, so gestures relative to the user's head don't have to subtract the
+# HMD's axes themselves. All devices are transformed together by PoseDecomposition, or by PredictedPoseDecomposition
+# for a predicted state, which is relative to the HMD's predicted pose.
+def HmdRelativeControllerState(controller_id: int, predicted: bool = False) -> type[ControllerStateGenerator]:
+    class _ConfiguredHmdRelativeControllerState(ControllerStateGenerator):
+        device_index = controller_id
+        requirements = {'base_state', 'decomposed_poses'}
+
+        def __init__(self, vr_system: VrSystemState):
+            decomposed_poses = _pose_decomposition(vr_system, predicted)
+            decomposed_poses.decomposes_hmd_relative_motion = True
+            super().__init__(vr_system, {'decomposed_poses': decomposed_poses})
+
+        @classmethod
+        def _parameterized_on(cls) -> list[Hashable]:
+            return [controller_id, predicted]
+
+        def generate_output(self, inputs: dict[str, Any]) -> ControllerStatePackage:
+            return {
+                'pose': inputs['decomposed_poses']['hmd_relative_poses'][controller_id],
+                'velocity': inputs['decomposed_poses']['hmd_relative_velocities'][controller_id],
+                'angular_velocity': inputs['decomposed_poses']['hmd_relative_angular_velocities'][controller_id],
+                'euler': inputs['decomposed_poses']['hmd_relative_euler'][controller_id],
+                'translation': inputs['decomposed_poses']['hmd_relative_translations'][controller_id],
+                'hmd_relative_pose': inputs['decomposed_poses']['hmd_relative_poses'][controller_id],
+                'controller_state': inputs['base_state']['controller_state'][controller_id],
+                'buttons_pressed': inputs['base_state']['buttons_pressed'][controller_id],
+                'buttons_touched': inputs['base_state']['buttons_touched'][controller_id],
+            }
+
+        def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+            base_state = inputs['base_state']
+            decomposed_poses = inputs['decomposed_poses']
+            return (
+                f"{{'pose': {decomposed_poses}['hmd_relative_poses'][{controller_id}], "
+                f"'velocity': {decomposed_poses}['hmd_relative_velocities'][{controller_id}], "
+                f"'angular_velocity': {decomposed_poses}['hmd_relative_angular_velocities'][{controller_id}], "
+                f"'euler': {decomposed_poses}['hmd_relative_euler'][{controller_id}], "
+                f"'translation': {decomposed_poses}['hmd_relative_translations'][{controller_id}], "
+                f"'hmd_relative_pose': {decomposed_poses}['hmd_relative_poses'][{controller_id}], "
+                f"'controller_state': {base_state}['controller_state'][{controller_id}], "
+                f"'buttons_pressed': {base_state}['buttons_pressed'][{controller_id}], "
+                f"'buttons_touched': {base_state}['buttons_touched'][{controller_id}]}}"
+            )
+
+    return _ConfiguredHmdRelativeControllerState
+
+
 class ControllerStateConsumer(ValueGenerator[O]):
     requirements = {'base_state'}
 
@@ -161,8 +652,19 @@ class ControllerStateConsumer(ValueGenerator[O]):
 
 
 def ControllerStateByType(device_class: DeviceClass,
-                          role: ControllerRole = 'no_role') -> Callable[[VrSystemState], ControllerStateGenerator]:
+                          role: ControllerRole = 'no_role',
+                          predicted: bool = False) -> Callable[[VrSystemState], ControllerStateGenerator]:
     def _GetControllerState(vr_system: VrSystemState) -> ControllerStateGenerator:
-        return ControllerState(vr_system.device_id_for_type(device_class, role))(vr_system)
+        return ControllerState(vr_system.track_device(device_class, role), predicted)(vr_system)
 
     return _GetControllerState
+
+
+def HmdRelativeControllerStateByType(
+        device_class: DeviceClass,
+        role: ControllerRole = 'no_role',
+        predicted: bool = False) -> Callable[[VrSystemState], ControllerStateGenerator]:
+    def _GetHmdRelativeControllerState(vr_system: VrSystemState) -> ControllerStateGenerator:
+        return HmdRelativeControllerState(vr_system.track_device(device_class, role), predicted)(vr_system)
+
+    return _GetHmdRelativeControllerState
@@ -1,5 +1,5 @@
 import math
-from typing import Any
+from typing import Any, Optional
 
 from vr_to_joystick.nodes.types import Axis
 from vr_to_joystick.nodes.vr_system_state import ControllerStateGenerator
@@ -14,8 +14,16 @@ class Wheel(Axis):
 
     def generate_output(self, inputs: dict[str, Any]) -> float:
         # compute angle in Z plane between two controllers
-        dx = inputs['right_controller']['pose'][0][3] - \
-            inputs['left_controller']['pose'][0][3]  # x distance from left to right
-        dy = inputs['right_controller']['pose'][1][3] - \
-            inputs['left_controller']['pose'][1][3]  # y distance from left to right
+        dx = float(inputs['right_controller']['translation'][0]) - \
+            float(inputs['left_controller']['translation'][0])  # x distance from left to right
+        dy = float(inputs['right_controller']['translation'][1]) - \
+            float(inputs['left_controller']['translation'][1])  # y distance from left to right
         return math.atan2(dy, dx)
+
+    def kernel_expression(self, inputs: dict[str, str]) -> Optional[str]:
+        left_translation = f"{inputs['left_controller']}['translation']"
+        right_translation = f"{inputs['right_controller']}['translation']"
+        return (
+            f"math.atan2(float({right_translation}[1]) - float({left_translation}[1]), "
+            f"float({right_translation}[0]) - float({left_translation}[0]))"
+        )
@@ -0,0 +1,199 @@
+from dataclasses import dataclass
+import logging
+from typing import Any, Callable, Iterable, Optional, Union
+
+from vr_to_joystick.graph import dependency_order
+from vr_to_joystick.nodes.axis_helpers import AxisMutator, PiecewiseAxis, ScaleAxis
+from vr_to_joystick.nodes.composite.axis import MaxOfAxes, MinOfAxes, NaryAxis, ProductOfAxes, SumOfAxes
+from vr_to_joystick.nodes.composite.button import AllButton, AnyButton, NaryButton, ParityButton
+from vr_to_joystick.nodes.emitter.axis import ConstantAxis
+from vr_to_joystick.nodes.emitter.button import AlwaysOffButton, AlwaysOnButton
+from vr_to_joystick.nodes.types import BaseButton, ButtonState
+from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+
+logger = logging.getLogger(__name__)
+
+# A rewrite rule returns a simpler node (or existing subgraph) that always produces the same value as the given node,
+# or None to leave it alone. The node's own dependencies have already been rewritten by the time a rule sees it.
+RewriteRule = Callable[[ValueGenerator[Any]], Optional[ValueGenerator[Any]]]
+
+
+@dataclass
+class OptimizationResult:
+    # nodes that were replaced, and what replaced them
+    replacements: dict[ValueConsumer, ValueGenerator[Any]]
+    nodes_before: int
+    nodes_after: int
+
+
+# whether a node's value depends only on its inputs this tick, i.e. it can be inlined into a compiled kernel
+def is_stateless(node: ValueGenerator[Any]) -> bool:
+    placeholder_inputs = {key: key for key in node.dependencies}
+    if isinstance(node, BaseButton):
+        return node.kernel_state_expression(placeholder_inputs) is not None
+
+    return node.kernel_expression(placeholder_inputs) is not None
+
+
+def constant_value(node: ValueGenerator[Any]) -> Optional[Any]:
+    if isinstance(node, ConstantAxis):
+        return node.value
+    if isinstance(node, AlwaysOnButton):
+        return ButtonState(active=True, tick_state='active')
+    if isinstance(node, AlwaysOffButton):
+        return ButtonState(active=False, tick_state='inactive')
+
+    return None
+
+
+# stateless nodes fed only by constants are evaluated once, here, and replaced with a constant
+def fold_constants(node: ValueGenerator[Any]) -> Optional[ValueGenerator[Any]]:
+    if not node.dependencies or constant_value(node) is not None or not is_stateless(node):
+        return None
+
+    inputs = {key: constant_value(dependency) for key, dependency in node.dependencies.items()}
+    if any(value is None for value in inputs.values()):
+        return None
+
+    # a button with constant inputs starts inactive and switches to its constant state on the first tick,
+    # exactly like the matching always-on or always-off button
+    if isinstance(node, BaseButton):
+        return AlwaysOnButton() if node.get_button_state_this_tick(inputs) else AlwaysOffButton()
+
+    value = node.generate_output(inputs)
+    if not isinstance(value, (int, float)):
+        return None
+
+    return ConstantAxis(value)
+
+
+# consecutive affine mutators (ScaleAxis, InvertedAxis, ...) collapse into a single ScaleAxis, or disappear entirely
+# if they cancel out. Note the folded coefficients can differ from step-by-step evaluation in the last bit or so.
+def fold_affine_chains(node: ValueGenerator[Any]) -> Optional[ValueGenerator[Any]]:
+    if not isinstance(node, AxisMutator) or (outer := node.affine_form()) is None:
+        return None
+
+    scale, offset = outer
+    parent = node.dependencies['parent_axis']
+    if isinstance(parent, AxisMutator) and (inner := parent.affine_form()) is not None:
+        inner_scale, inner_offset = inner
+        scale, offset = scale * inner_scale, scale * inner_offset + offset
+        parent = parent.dependencies['parent_axis']
+    elif (scale, offset) != (1, 0):
+        return None
+
+    if (scale, offset) == (1, 0):
+        return parent
+
+    return ScaleAxis(scale, 0.0, offset)(parent)
+
+
+# a clamp or deadzone applied on top of another clamp or deadzone becomes a single PiecewiseAxis
+def fuse_piecewise_chains(node: ValueGenerator[Any]) -> Optional[ValueGenerator[Any]]:
+    if not isinstance(node, AxisMutator) or (outer := node.piecewise_form()) is None:
+        return None
+
+    parent = node.dependencies['parent_axis']
+    if not isinstance(parent, AxisMutator) or (inner := parent.piecewise_form()) is None:
+        return None
+
+    inner_deadzone, inner_min, inner_max = inner
+    outer_deadzone, outer_min, outer_max = outer
+    axis_min, axis_max = max(inner_min, outer_min), min(inner_max, outer_max)
+
+    # a deadzone applied after a clamp can't be expressed as a single deadzone-then-clamp,
+    # and clamps to ranges that don't overlap don't intersect into one
+    inner_clamps = (inner_min, inner_max) != (-float('inf'), float('inf'))
+    if (outer_deadzone > 0 and inner_clamps) or axis_min > axis_max:
+        return None
+
+    return PiecewiseAxis(max(inner_deadzone, outer_deadzone), axis_min, axis_max)(parent.dependencies['parent_axis'])
+
+
+FLATTENABLE_COMPOSITES: list[Union[type[NaryAxis], type[NaryButton]]] = [
+    SumOfAxes,
+    ProductOfAxes,
+    MaxOfAxes,
+    MinOfAxes,
+    AllButton,
+    AnyButton,
+    ParityButton,
+]
+
+
+# Nested composites applying the same associative operation, e.g. AndButton(AndButton(a, b), c), collapse into a
+# single N-ary node like AllButton(a, b, c). Operands are only absorbed if nothing else consumes them, so shared
+# subexpressions are still computed once. Note that flattening regroups float sums and products, which can change
+# the result in the last bit or so.
+def flatten_composites(node: ValueGenerator[Any]) -> Optional[ValueGenerator[Any]]:
+    composite = next(
+        (nary for nary in FLATTENABLE_COMPOSITES if type(node) is nary or type(node) in nary.flattens),
+        None)
+    if composite is None:
+        return None
+
+    def absorbs(operand: ValueGenerator[Any]) -> bool:
+        same_operation = type(operand) is composite or type(operand) in composite.flattens
+        return same_operation and all(child is node for child in operand.bound_children)
+
+    if not any(absorbs(operand) for operand in node.dependencies.values()):
+        return None
+
+    operands: list[ValueGenerator[Any]] = []
+    for operand in node.dependencies.values():
+        operands.extend(operand.dependencies.values() if absorbs(operand) else [operand])
+
+    return composite(*operands)
+
+
+SIMPLIFICATION_RULES: list[RewriteRule] = [
+    fold_constants,
+    fold_affine_chains,
+    fuse_piecewise_chains,
+    flatten_composites,
+]
+
+
+# applies the rules to a single node until none of them simplify it any further
+def apply_rules(node: ValueGenerator[Any], rules: list[RewriteRule]) -> ValueGenerator[Any]:
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            rewritten = rule(node)
+            if rewritten is not None and rewritten is not node:
+                node = rewritten
+                changed = True
+
+    return node
+
+
+# Applies the rules to every node the sinks depend on, dependencies first, rebinding consumers onto the replacements
+# as it goes. Replaced nodes stay bound to their own dependencies, so only processors that prune by sink skip them.
+def rewrite_graph(
+        sinks: Iterable[ValueConsumer],
+        rules: list[RewriteRule]) -> dict[ValueConsumer, ValueGenerator[Any]]:
+    replacements: dict[ValueConsumer, ValueGenerator[Any]] = {}
+
+    for node in dependency_order(sinks):
+        for key, dependency in node.dependencies.items():
+            if dependency in replacements:
+                node.rebind_dependency(key, replacements[dependency])
+
+        if not isinstance(node, ValueGenerator):
+            continue
+
+        simplified = apply_rules(node, rules)
+
+        if simplified is not node:
+            replacements[node] = simplified
+
+    return replacements
+
+
+def optimize_graph(sinks: list[ValueConsumer], rules: list[RewriteRule] = SIMPLIFICATION_RULES) -> OptimizationResult:
+    nodes_before = len(dependency_order(sinks))
+    replacements = rewrite_graph(sinks, rules)
+    nodes_after = len(dependency_order(replacements.get(sink, sink) for sink in sinks))
+
+    return OptimizationResult(replacements=replacements, nodes_before=nodes_before, nodes_after=nodes_after)
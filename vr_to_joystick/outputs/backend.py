@@ -0,0 +1,38 @@
+from abc import ABC, abstractmethod
+from typing import Iterable
+
+# The axes a mapping can output to. Each backend maps these onto its own device's axes: vJoy's axes of the same names,
+# or the closest evdev absolute axes.
+AXIS_X = 1
+AXIS_Y = 2
+AXIS_Z = 3
+AXIS_RX = 4
+AXIS_RY = 5
+AXIS_RZ = 6
+AXIS_SL0 = 7
+AXIS_SL1 = 8
+AXIS_WHEEL = 9
+OUTPUT_AXES = [AXIS_X, AXIS_Y, AXIS_Z, AXIS_RX, AXIS_RY, AXIS_RZ, AXIS_SL0, AXIS_SL1, AXIS_WHEEL]
+
+
+# Where a mapping's values end up, e.g. a virtual joystick. Values are staged with set_axis/set_button over the course
+# of a tick and sent together by submit(), so backends talking to a driver can make a single call per tick.
+# Axis values are integers from 0 to ControllerMapping.AXIS_PRECISION, with the center at half that. Buttons are
+# numbered from 1.
+class OutputBackend(ABC):
+    # Called once with every axis and button the mapping outputs to, before anything is set, for backends that have
+    # to set up a device with the right controls.
+    def declare_outputs(self, axis_ids: Iterable[int], button_ids: Iterable[int]) -> None:
+        pass
+
+    @abstractmethod
+    def set_axis(self, axis_id: int, value: int) -> None:
+        pass
+
+    @abstractmethod
+    def set_button(self, button_id: int, active: bool) -> None:
+        pass
+
+    @abstractmethod
+    def submit(self) -> None:
+        pass
@@ -0,0 +1,67 @@
+from dataclasses import dataclass, field
+import time
+from typing import Callable, Iterable
+
+from vr_to_joystick.outputs.backend import OutputBackend
+
+
+# Wraps another backend, only passing on writes that change an output. Axis moves of at most jitter_steps
+# quantization steps from the last value written are dropped too, so sensor noise doesn't reach the device, while
+# slower drift still goes through once it adds up. Ticks where nothing changed at all skip the submit as well.
+@dataclass
+class ChangeOnlyBackend(OutputBackend):
+    backend: OutputBackend
+    jitter_steps: int = 0
+    clock: Callable[[], float] = time.monotonic
+    # writes (including submits) dropped over the last full second
+    writes_saved_per_second: int = field(default=0, init=False)
+    writes_saved_before_window: int = field(default=0, init=False)
+    last_axes: dict[int, int] = field(default_factory=dict, init=False)
+    last_buttons: dict[int, bool] = field(default_factory=dict, init=False)
+    changed: bool = field(default=False, init=False)
+    window_started: float = field(init=False)
+    window_saved: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        self.window_started = self.clock()
+
+    # writes dropped since the backend was created
+    @property
+    def writes_saved(self) -> int:
+        return self.writes_saved_before_window + self.window_saved
+
+    def declare_outputs(self, axis_ids: Iterable[int], button_ids: Iterable[int]) -> None:
+        self.backend.declare_outputs(axis_ids, button_ids)
+
+    def set_axis(self, axis_id: int, value: int) -> None:
+        last_value = self.last_axes.get(axis_id)
+        if last_value is not None and abs(value - last_value) <= self.jitter_steps:
+            self.window_saved += 1
+            return
+
+        self.last_axes[axis_id] = value
+        self.changed = True
+        self.backend.set_axis(axis_id, value)
+
+    def set_button(self, button_id: int, active: bool) -> None:
+        if self.last_buttons.get(button_id) == active:
+            self.window_saved += 1
+            return
+
+        self.last_buttons[button_id] = active
+        self.changed = True
+        self.backend.set_button(button_id, active)
+
+    def submit(self) -> None:
+        if self.changed:
+            self.changed = False
+            self.backend.submit()
+        else:
+            self.window_saved += 1
+
+        now = self.clock()
+        if now - self.window_started >= 1:
+            self.writes_saved_before_window += self.window_saved
+            self.writes_saved_per_second = round(self.window_saved / (now - self.window_started))
+            self.window_saved = 0
+            self.window_started = now
@@ -0,0 +1,39 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from vr_to_joystick.outputs.backend import OutputBackend
+
+
+# Output backend that keeps everything in memory, for running and testing mappings without a driver. Counts calls
+# the way a driver would see them: staging values is free, and each submit is one call. With record set, the values
+# as of every submit are kept too, so a whole run can be replayed or compared afterwards.
+@dataclass
+class MemoryBackend(OutputBackend):
+    record: bool = False
+    # values as of the last submit
+    axes: dict[int, int] = field(default_factory=dict)
+    buttons: dict[int, bool] = field(default_factory=dict)
+    driver_calls: int = 0
+    staged_axes: dict[int, int] = field(default_factory=dict)
+    staged_buttons: dict[int, bool] = field(default_factory=dict)
+    declared_axes: list[int] = field(default_factory=list)
+    declared_buttons: list[int] = field(default_factory=list)
+    # (axes, buttons) as of each submit, while recording
+    frames: list[tuple[dict[int, int], dict[int, bool]]] = field(default_factory=list)
+
+    def declare_outputs(self, axis_ids: Iterable[int], button_ids: Iterable[int]) -> None:
+        self.declared_axes = list(axis_ids)
+        self.declared_buttons = list(button_ids)
+
+    def set_axis(self, axis_id: int, value: int) -> None:
+        self.staged_axes[axis_id] = value
+
+    def set_button(self, button_id: int, active: bool) -> None:
+        self.staged_buttons[button_id] = active
+
+    def submit(self) -> None:
+        self.driver_calls += 1
+        self.axes.update(self.staged_axes)
+        self.buttons.update(self.staged_buttons)
+        if self.record:
+            self.frames.append((dict(self.axes), dict(self.buttons)))
@@ -0,0 +1,26 @@
+from typing import Callable, Literal
+
+from vr_to_joystick.outputs.backend import OutputBackend
+from vr_to_joystick.outputs.memory import MemoryBackend
+
+OutputName = Literal['vjoy', 'uinput', 'memory']
+
+
+# Backends talking to a driver are only imported once picked, so each one only needs its own driver's package, e.g.
+# the graph can run into uinput or memory on Linux without pyvjoy and its DLL
+def _vjoy(device_id: int) -> OutputBackend:
+    from vr_to_joystick.outputs.vjoy import VJoyBackend
+    return VJoyBackend(device_id)
+
+
+def _uinput(device_id: int) -> OutputBackend:
+    from vr_to_joystick.outputs.uinput import DEVICE_NAME, UInputBackend
+    return UInputBackend(f"{DEVICE_NAME} {device_id}")
+
+
+# each factory takes the number of the device to output to, where the backend has more than one
+OUTPUTS: dict[OutputName, Callable[[int], OutputBackend]] = {
+    'vjoy': _vjoy,
+    'uinput': _uinput,
+    'memory': lambda _: MemoryBackend(),
+}
@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+from vr_to_joystick.outputs.backend import OutputBackend
+
+
+# Sends the same outputs to several backends, e.g. a virtual joystick for the game and a UDP stream for an overlay
+@dataclass
+class TeeBackend(OutputBackend):
+    backends: list[OutputBackend]
+
+    def declare_outputs(self, axis_ids: Iterable[int], button_ids: Iterable[int]) -> None:
+        axis_ids = list(axis_ids)
+        button_ids = list(button_ids)
+        for backend in self.backends:
+            backend.declare_outputs(axis_ids, button_ids)
+
+    def set_axis(self, axis_id: int, value: int) -> None:
+        for backend in self.backends:
+            backend.set_axis(axis_id, value)
+
+    def set_button(self, button_id: int, active: bool) -> None:
+        for backend in self.backends:
+            backend.set_button(button_id, active)
+
+    def submit(self) -> None:
+        for backend in self.backends:
+            backend.submit()
@@ -0,0 +1,117 @@
+from dataclasses import dataclass, field
+import logging
+import socket
+import struct
+import time
+from typing import Callable
+
+from vr_to_joystick.outputs.backend import OUTPUT_AXES, OutputBackend
+
+logger = logging.getLogger(__name__)
+
+# Every frame has the same 50 byte little-endian layout, whatever the mapping outputs:
+#   3s   magic, b'VRJ'
+#   B    frame format version
+#   I    sequence number, counting up from 0 and wrapping at 2^32
+#   q    timestamp the frame was sent at, in nanoseconds on the sender's clock (time.time_ns by default)
+#   9h   axes in OUTPUT_AXES order, as signed offsets from the center, so -0x4000 to 0x4000 with 0 centered
+#   4I   buttons 1-128, 32 to a word, button 1 in the low bit of the first word
+# Axes and buttons a mapping doesn't output are held at 0.
+FRAME = struct.Struct('<3sBIq9h4I')
+FRAME_MAGIC = b'VRJ'
+FRAME_VERSION = 1
+MAX_BUTTONS = 128
+BUTTONS_PER_WORD = 32
+AXIS_MAX = 0x8000
+AXIS_CENTER = 0x4000
+SEQUENCE_MODULUS = 1 << 32
+# where each axis goes in a frame
+AXIS_INDEXES = {axis_id: index for index, axis_id in enumerate(OUTPUT_AXES)}
+
+
+# parses a HOST:PORT address, e.g. from the command line
+def parse_address(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected an address like HOST:PORT, got '{value}'")
+
+    return host, int(port)
+
+
+# A frame as decoded by a receiver, with axes back in output values, from 0 to 0x8000
+@dataclass(frozen=True)
+class UdpFrame:
+    sequence: int
+    timestamp_ns: int
+    axes: dict[int, int]
+    buttons: dict[int, bool]
+
+
+def decode_frame(data: bytes) -> UdpFrame:
+    if len(data) != FRAME.size:
+        raise ValueError(f"Frames are {FRAME.size} bytes, got {len(data)}")
+    magic, version, sequence, timestamp_ns, *values = FRAME.unpack(data)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"Not a version {FRAME_VERSION} frame: magic {magic!r}, version {version}")
+
+    axis_values = values[:len(OUTPUT_AXES)]
+    buttons = sum(word << (index * BUTTONS_PER_WORD) for index, word in enumerate(values[len(OUTPUT_AXES):]))
+    return UdpFrame(
+        sequence,
+        timestamp_ns,
+        {axis_id: value + AXIS_CENTER for axis_id, value in zip(OUTPUT_AXES, axis_values)},
+        {button_id: bool(buttons >> (button_id - 1) & 1) for button_id in range(1, MAX_BUTTONS + 1)})
+
+
+# Streams the outputs over UDP to target, one FRAME per submit carrying every axis and button, so a receiver only
+# ever needs the latest frame and a lost one is made up for by the next. Frames are packed into the same buffer every
+# tick and sent from a connected, non-blocking socket, so a receiver that's slow or not there yet can't hold up a tick:
+# frames the socket can't take right away are dropped and counted instead.
+@dataclass
+class UdpBackend(OutputBackend):
+    target: tuple[str, int]
+    clock: Callable[[], int] = time.time_ns
+    sequence: int = field(default=0, init=False)
+    frames_sent: int = field(default=0, init=False)
+    frames_dropped: int = field(default=0, init=False)
+    axis_values: list[int] = field(default_factory=lambda: [0] * len(OUTPUT_AXES), init=False)
+    button_words: list[int] = field(default_factory=lambda: [0] * (MAX_BUTTONS // BUTTONS_PER_WORD), init=False)
+    frame: bytearray = field(default_factory=lambda: bytearray(FRAME.size), init=False)
+    udp_socket: socket.socket = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.setblocking(False)
+        # connecting just fixes the destination, so sends skip the address lookup
+        self.udp_socket.connect(self.target)
+        logger.info(f"Streaming outputs to {self.target[0]}:{self.target[1]} over UDP.")
+
+    def set_axis(self, axis_id: int, value: int) -> None:
+        # mappings can push an axis past its ends, e.g. turning the wheel further than its range, which is held at the
+        # end the way a driver would, so it fits in the frame
+        self.axis_values[AXIS_INDEXES[axis_id]] = min(max(value, 0), AXIS_MAX) - AXIS_CENTER
+
+    def set_button(self, button_id: int, active: bool) -> None:
+        if not 1 <= button_id <= MAX_BUTTONS:
+            raise ValueError(f"UDP frames carry buttons 1 to {MAX_BUTTONS}, got {button_id}")
+
+        word, bit = divmod(button_id - 1, BUTTONS_PER_WORD)
+        if active:
+            self.button_words[word] |= 1 << bit
+        else:
+            self.button_words[word] &= ~(1 << bit)
+
+    def submit(self) -> None:
+        FRAME.pack_into(
+            self.frame, 0, FRAME_MAGIC, FRAME_VERSION, self.sequence, self.clock(), *self.axis_values,
+            *self.button_words)
+        self.sequence = (self.sequence + 1) % SEQUENCE_MODULUS
+        try:
+            self.udp_socket.send(self.frame)
+            self.frames_sent += 1
+        except (BlockingIOError, ConnectionRefusedError):
+            # a full send buffer, or (on loopback) an earlier frame finding nothing listening
+            self.frames_dropped += 1
+
+    def close(self) -> None:
+        self.udp_socket.close()
@@ -0,0 +1,97 @@
+import logging
+import os
+import struct
+from typing import Any, Iterable, Optional, Sequence
+
+from evdev import AbsInfo, UInput, ecodes
+
+from vr_to_joystick.outputs.backend import (
+    AXIS_RX,
+    AXIS_RY,
+    AXIS_RZ,
+    AXIS_SL0,
+    AXIS_SL1,
+    AXIS_WHEEL,
+    AXIS_X,
+    AXIS_Y,
+    AXIS_Z,
+    OutputBackend,
+)
+
+logger = logging.getLogger(__name__)
+
+# evdev absolute axes standing in for each output axis
+AXIS_CODES: dict[int, int] = {
+    AXIS_X: ecodes.ABS_X,
+    AXIS_Y: ecodes.ABS_Y,
+    AXIS_Z: ecodes.ABS_Z,
+    AXIS_RX: ecodes.ABS_RX,
+    AXIS_RY: ecodes.ABS_RY,
+    AXIS_RZ: ecodes.ABS_RZ,
+    AXIS_SL0: ecodes.ABS_THROTTLE,
+    AXIS_SL1: ecodes.ABS_RUDDER,
+    AXIS_WHEEL: ecodes.ABS_WHEEL,
+}
+# Buttons 1-16 are the joystick buttons from BTN_TRIGGER on, which is what games look for on a joystick, and the rest
+# carry on into the BTN_TRIGGER_HAPPY range
+JOYSTICK_BUTTONS = ecodes.BTN_DEAD - ecodes.BTN_TRIGGER + 1
+MAX_BUTTONS = JOYSTICK_BUTTONS + ecodes.BTN_TRIGGER_HAPPY40 - ecodes.BTN_TRIGGER_HAPPY1 + 1
+AXIS_MAX = 0x8000
+AXIS_CENTER = 0x4000
+DEVICE_NAME = 'vr-to-joystick virtual joystick'
+# struct input_event: a timeval the kernel fills in itself, then the event's type, code and value
+INPUT_EVENT = struct.Struct('llHHi')
+SYNC_EVENT = INPUT_EVENT.pack(0, 0, ecodes.EV_SYN, ecodes.SYN_REPORT, 0)
+
+
+def button_code(button_id: int) -> int:
+    if not 1 <= button_id <= MAX_BUTTONS:
+        raise ValueError(f"uinput joysticks have buttons 1 to {MAX_BUTTONS}, got {button_id}")
+
+    if button_id <= JOYSTICK_BUTTONS:
+        return int(ecodes.BTN_TRIGGER + button_id - 1)
+    return int(ecodes.BTN_TRIGGER_HAPPY1 + button_id - JOYSTICK_BUTTONS - 1)
+
+
+# Linux virtual joystick, created through /dev/uinput once the mapping declares its outputs, with just the axes and
+# buttons it uses. Values changed over the tick are packed into input events and written, along with the report that
+# ends them, in a single write() to the device on submit, the way VJoyBackend makes a single driver call.
+class UInputBackend(OutputBackend):
+    device: Optional[UInput]
+    # packed events for the axes and buttons changed since the last submit, by event code
+    staged_events: dict[int, bytes]
+
+    def __init__(self, name: str = DEVICE_NAME):
+        self.name = name
+        self.device = None
+        self.staged_events = {}
+
+    def declare_outputs(self, axis_ids: Iterable[int], button_ids: Iterable[int]) -> None:
+        axis_info = AbsInfo(value=AXIS_CENTER, min=0, max=AXIS_MAX, fuzz=0, flat=0, resolution=0)
+        # absolute axes are declared along with their ranges, as (code, AbsInfo) pairs
+        capabilities: dict[int, Sequence[Any]] = {
+            ecodes.EV_ABS: [(AXIS_CODES[axis_id], axis_info) for axis_id in axis_ids],
+            ecodes.EV_KEY: [button_code(button_id) for button_id in button_ids],
+        }
+        logger.info(f"Creating uinput device '{self.name}'...")
+        self.device = UInput(capabilities, name=self.name)
+        logger.info(f"Created at {os.fsdecode(self.device.device.path)}.")
+
+    def set_axis(self, axis_id: int, value: int) -> None:
+        code = AXIS_CODES[axis_id]
+        # mappings can push an axis past its ends, e.g. turning the wheel further than its range, which is held at the
+        # end of the range declared for the device, as UdpBackend does
+        self.staged_events[code] = INPUT_EVENT.pack(0, 0, ecodes.EV_ABS, code, min(max(value, 0), AXIS_MAX))
+
+    def set_button(self, button_id: int, active: bool) -> None:
+        code = button_code(button_id)
+        self.staged_events[code] = INPUT_EVENT.pack(0, 0, ecodes.EV_KEY, code, int(active))
+
+    def submit(self) -> None:
+        if self.device is None:
+            raise RuntimeError("Outputs have to be declared before the uinput device can be written to")
+        if not self.staged_events:
+            return
+
+        os.write(self.device.fd, b''.join([*self.staged_events.values(), SYNC_EVENT]))
+        self.staged_events.clear()
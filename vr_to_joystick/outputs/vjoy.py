@@ -0,0 +1,68 @@
+import logging
+
+from pyvjoy.vjoydevice import VJoyDevice
+
+from vr_to_joystick.outputs.backend import (
+    AXIS_RX,
+    AXIS_RY,
+    AXIS_RZ,
+    AXIS_SL0,
+    AXIS_SL1,
+    AXIS_WHEEL,
+    AXIS_X,
+    AXIS_Y,
+    AXIS_Z,
+    OutputBackend,
+)
+
+logger = logging.getLogger(__name__)
+
+# fields of vjoy's JOYSTICK_POSITION_V2 structure holding each axis
+AXIS_FIELDS: dict[int, str] = {
+    AXIS_X: 'wAxisX',
+    AXIS_Y: 'wAxisY',
+    AXIS_Z: 'wAxisZ',
+    AXIS_RX: 'wAxisXRot',
+    AXIS_RY: 'wAxisYRot',
+    AXIS_RZ: 'wAxisZRot',
+    AXIS_SL0: 'wSlider',
+    AXIS_SL1: 'wDial',
+    AXIS_WHEEL: 'wWheel',
+}
+# fields holding buttons 1-32, 33-64, 65-96 and 97-128, one bit per button
+BUTTON_FIELDS = ['lButtons', 'lButtonsEx1', 'lButtonsEx2', 'lButtonsEx3']
+BUTTONS_PER_FIELD = 32
+AXIS_CENTER = 0x4000
+
+
+# Fills the device's position structure over the tick and sends it with a single UpdateVJD call, rather than making
+# a driver call for every axis and button. Since every update overwrites the whole device, axes the mapping never
+# sets are held at their center.
+class VJoyBackend(OutputBackend):
+    device: VJoyDevice
+    button_words: list[int]
+
+    def __init__(self, device_id: int):
+        logger.info(f"Claiming target VJoy device {device_id}...")
+        self.device = VJoyDevice(device_id)
+        logger.info("Claimed.")
+        for field in AXIS_FIELDS.values():
+            setattr(self.device.data, field, AXIS_CENTER)
+        self.button_words = [0] * len(BUTTON_FIELDS)
+
+    def set_axis(self, axis_id: int, value: int) -> None:
+        setattr(self.device.data, AXIS_FIELDS[axis_id], value)
+
+    def set_button(self, button_id: int, active: bool) -> None:
+        word, bit = divmod(button_id - 1, BUTTONS_PER_FIELD)
+        if active:
+            self.button_words[word] |= 1 << bit
+        else:
+            self.button_words[word] &= ~(1 << bit)
+
+    def submit(self) -> None:
+        for field, word in zip(BUTTON_FIELDS, self.button_words):
+            # the structure's button fields are signed, so button 32 is the sign bit
+            setattr(self.device.data, field, word - (1 << 32) if word & (1 << 31) else word)
+
+        self.device.update()
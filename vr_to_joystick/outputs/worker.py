@@ -0,0 +1,166 @@
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from vr_to_joystick.outputs.backend import OutputBackend
+
+logger = logging.getLogger(__name__)
+
+NANOSECONDS_PER_MICROSECOND = 1000
+
+
+# One tick's outputs: the axes and buttons set over the tick, and the haptic pulses to send along with them
+@dataclass
+class OutputFrame:
+    axes: dict[int, int] = field(default_factory=dict)
+    buttons: dict[int, bool] = field(default_factory=dict)
+    # (device index, duration in us) for each pulse
+    haptic_pulses: list[tuple[int, int]] = field(default_factory=list)
+    # perf_counter_ns when the latest tick merged into this frame was published
+    published_ns: int = 0
+
+    def clear(self) -> None:
+        self.axes.clear()
+        self.buttons.clear()
+        self.haptic_pulses.clear()
+
+
+# How many frames the output thread wrote and how many were overwritten before it got to them, and how long it took
+# from the end of a tick to its outputs being written. Accumulated as running sums, like TickStats, so swap in a
+# fresh instance to start a new reporting window.
+@dataclass
+class OutputStats:
+    published: int = 0
+    written: int = 0
+    dropped: int = 0
+    latency_sum_ns: int = 0
+    max_latency_ns: int = 0
+    # time spent in the backend's submit alone, i.e. in the driver
+    write_sum_ns: int = 0
+    max_write_ns: int = 0
+
+    def record(self, published_ns: int, write_started_ns: int, written_ns: int) -> None:
+        self.written += 1
+        latency_ns = written_ns - published_ns
+        self.latency_sum_ns += latency_ns
+        self.max_latency_ns = max(self.max_latency_ns, latency_ns)
+        write_ns = written_ns - write_started_ns
+        self.write_sum_ns += write_ns
+        self.max_write_ns = max(self.max_write_ns, write_ns)
+
+    @property
+    def mean_latency_us(self) -> float:
+        return self.latency_sum_ns / max(self.written, 1) / NANOSECONDS_PER_MICROSECOND
+
+    @property
+    def mean_write_us(self) -> float:
+        return self.write_sum_ns / max(self.written, 1) / NANOSECONDS_PER_MICROSECOND
+
+    def summary(self) -> str:
+        return (
+            f"{self.written} of {self.published} frame(s) written, {self.dropped} dropped as stale, "
+            f"tick end to written mean {self.mean_latency_us:.0f}us / max {self.max_latency_ns / 1000:.0f}us, "
+            f"driver write mean {self.mean_write_us:.0f}us / max {self.max_write_ns / 1000:.0f}us"
+        )
+
+
+# Hands outputs over to a thread of their own, so a slow driver call eats into that thread's time rather than the
+# tick's. Over a tick, set_axis/set_button fill the back frame, which submit publishes by merging it into the front
+# frame and waking the output thread. The output thread stages the front frame on the wrapped backend, then makes the
+# actual driver call, and sends any haptic pulses, without holding the lock, so the tick only ever waits on the
+# staging. When a tick publishes before the output thread has taken the last frame, the stale values are overwritten
+# and only the latest are written, but haptic pulses are kept, since each one is an event rather than a state.
+#
+# Errors raised writing to the backend stop the output thread and are raised again from the next submit.
+class OutputWorker(OutputBackend):
+    backend: OutputBackend
+    pulse: Optional[Callable[[int, int, int], None]]
+    back: OutputFrame
+    front: OutputFrame
+    pending: bool
+    stats: OutputStats
+    error: Optional[BaseException]
+
+    # pulse is called with openvr's triggerHapticPulse arguments: a device index, an axis and a duration in us
+    def __init__(self, backend: OutputBackend, pulse: Optional[Callable[[int, int, int], None]] = None):
+        self.backend = backend
+        self.pulse = pulse
+        self.back = OutputFrame()
+        self.front = OutputFrame()
+        self.pending = False
+        self.stats = OutputStats()
+        self.error = None
+        self.running = True
+        self.frame_published = threading.Condition()
+        self.thread = threading.Thread(target=self.write_frames, name='output', daemon=True)
+        self.thread.start()
+
+    # devices are set up on the calling thread, before any frame can reach the output thread
+    def declare_outputs(self, axis_ids: Iterable[int], button_ids: Iterable[int]) -> None:
+        self.backend.declare_outputs(axis_ids, button_ids)
+
+    def set_axis(self, axis_id: int, value: int) -> None:
+        self.back.axes[axis_id] = value
+
+    def set_button(self, button_id: int, active: bool) -> None:
+        self.back.buttons[button_id] = active
+
+    def add_haptic_pulse(self, device_index: int, duration_mcs: int) -> None:
+        self.back.haptic_pulses.append((device_index, duration_mcs))
+
+    def submit(self) -> None:
+        if self.error is not None:
+            raise RuntimeError("The output thread stopped writing outputs") from self.error
+
+        with self.frame_published:
+            self.stats.published += 1
+            if self.pending:
+                self.stats.dropped += 1
+            self.front.axes.update(self.back.axes)
+            self.front.buttons.update(self.back.buttons)
+            self.front.haptic_pulses.extend(self.back.haptic_pulses)
+            self.front.published_ns = time.perf_counter_ns()
+            self.pending = True
+            self.frame_published.notify()
+        self.back.clear()
+
+    def write_frames(self) -> None:
+        pulses: list[tuple[int, int]] = []
+        try:
+            while True:
+                with self.frame_published:
+                    while self.running and not self.pending:
+                        self.frame_published.wait()
+                    if not self.running:
+                        return
+
+                    for axis_id, value in self.front.axes.items():
+                        self.backend.set_axis(axis_id, value)
+                    for button_id, active in self.front.buttons.items():
+                        self.backend.set_button(button_id, active)
+                    pulses, self.front.haptic_pulses = self.front.haptic_pulses, pulses
+                    published_ns = self.front.published_ns
+                    self.front.clear()
+                    self.pending = False
+
+                write_started_ns = time.perf_counter_ns()
+                self.backend.submit()
+                self.stats.record(published_ns, write_started_ns, time.perf_counter_ns())
+                if self.pulse is not None:
+                    for device_index, duration_mcs in pulses:
+                        self.pulse(device_index, 0, duration_mcs)
+                pulses.clear()
+        except BaseException as error:
+            logger.exception("Output thread stopped")
+            self.error = error
+
+    # writes whatever is still pending, then stops the output thread
+    def close(self) -> None:
+        with self.frame_published:
+            while self.pending and self.error is None and self.thread.is_alive():
+                self.frame_published.wait(0.01)
+            self.running = False
+            self.frame_published.notify()
+        self.thread.join()
@@ -0,0 +1,191 @@
+from dataclasses import dataclass, field
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Literal, Optional
+
+from vr_to_joystick.graph import ScheduleStep, partition_schedule, step_nodes
+from vr_to_joystick.nodes.vr_system_state import VrSystemStateConsumer
+from vr_to_joystick.scheduled_processor import ScheduledProcessor
+
+logger = logging.getLogger(__name__)
+
+# How the partitions are being run: by the pool of worker threads, one after another on the calling thread, or
+# alternating between the two while timing which is faster
+ParallelMode = Literal['parallel', 'serial', 'measuring']
+
+
+# Whether the interpreter holds a global lock while running Python code. Only free-threaded builds (3.13t and up) can
+# run nodes on several threads at once; otherwise threads only overlap while a node is in code that releases the lock,
+# like numpy on large arrays.
+def gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else bool(is_gil_enabled())
+
+
+# CPUs this process may run on, which can be fewer than the machine has, e.g. in a container
+def available_cpus() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Runs the same lazy schedule as ScheduledProcessor, split once at construction into a shared part and partitions
+# that don't depend on each other (see partition_schedule), with everything that reads every device at once, like the
+# root and PoseDecomposition, in the shared part. That usually leaves a partition per device, or per group of devices
+# read together. Each tick, the shared part runs on the calling thread, then the partitions run spread over a pool of
+# worker threads started once, with the calling thread taking a share of its own, and the tick waits for all of them.
+#
+# Handing work to other threads costs more than most nodes take to update, so parallelism only pays for large graphs
+# on free-threaded builds, or for nodes that spend their time outside the interpreter lock. Unless told which to use,
+# the processor times both ways over the first ticks and keeps the faster, shutting the workers down if that's serial.
+# Graphs that don't split into at least two partitions always run serially.
+#
+# Nodes in separate partitions update concurrently, so anything they share outside the graph (the output backend's
+# haptic pulse sink, or the VR system when pulses go straight to it, say) has to be safe to call from several threads.
+@dataclass
+class ParallelProcessor(ScheduledProcessor):
+    CALIBRATION_TICKS = 64  # ticks timed each way before picking one
+    # worker threads to spread partitions over, counting the calling thread, defaulting to one per available CPU
+    threads: Optional[int] = None
+    # True or False to always or never run partitions in parallel, None to measure which is faster
+    parallel: Optional[bool] = None
+    shared_steps: list[ScheduleStep] = field(init=False)
+    partitions: list[list[ScheduleStep]] = field(init=False)
+    # the partitions each thread runs, the calling thread's first
+    shares: list[list[ScheduleStep]] = field(init=False)
+    mode: ParallelMode = field(init=False)
+    workers: list[threading.Thread] = field(default_factory=list, init=False)
+    tick_started: Optional[threading.Barrier] = field(default=None, init=False)
+    tick_finished: Optional[threading.Barrier] = field(default=None, init=False)
+    # the tick the workers are running, and whether they're running every branch of it
+    running_tick: int = field(default=0, init=False)
+    running_every_branch: bool = field(default=False, init=False)
+    errors: list[BaseException] = field(default_factory=list, init=False)
+    # nanoseconds spent running ticks each way while measuring
+    parallel_ns: int = field(default=0, init=False)
+    serial_ns: int = field(default=0, init=False)
+    measured_ticks: int = field(default=0, init=False)
+
+    def compile(self) -> None:
+        super().compile()
+        self.close()
+
+        shared_nodes = [
+            node for node in self.schedule
+            if node is self.root_node or isinstance(node, VrSystemStateConsumer) and node.device_index is None
+        ]
+        self.shared_steps, self.partitions = partition_schedule(self.steps, shared_nodes)
+        thread_count = min(self.threads or available_cpus(), len(self.partitions))
+
+        # largest partitions first, each onto whichever thread has the fewest nodes to update so far
+        self.shares = [[] for _ in range(thread_count)]
+        share_sizes = [0] * thread_count
+        for partition in sorted(self.partitions, key=partition_size, reverse=True):
+            share = share_sizes.index(min(share_sizes))
+            self.shares[share].extend(partition)
+            share_sizes[share] += partition_size(partition)
+
+        logger.info(
+            f"Split the schedule into {partition_size(self.shared_steps)} shared node(s) and "
+            f"{len(self.partitions)} independent partition(s) of {', '.join(map(str, sorted(share_sizes)))} node(s) "
+            f"per thread, GIL {'enabled' if gil_enabled() else 'disabled'}")
+
+        if thread_count < 2 or self.parallel is False:
+            self.mode = 'serial'
+        else:
+            self.start_workers()
+            self.mode = 'parallel' if self.parallel else 'measuring'
+        self.parallel_ns = self.serial_ns = self.measured_ticks = 0
+
+    def start_workers(self) -> None:
+        self.tick_started = threading.Barrier(len(self.shares))
+        self.tick_finished = threading.Barrier(len(self.shares))
+        self.workers = [
+            threading.Thread(target=self.run_share, args=[share], name=f'partition-{index}', daemon=True)
+            for index, share in enumerate(self.shares[1:], start=1)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def run_share(self, share: list[ScheduleStep]) -> None:
+        assert self.tick_started is not None and self.tick_finished is not None
+        while True:
+            self.tick_started.wait()
+            if not self.workers:
+                return
+
+            try:
+                self.run_steps(share, self.running_tick, self.running_every_branch)
+            except BaseException as error:
+                self.errors.append(error)
+            self.tick_finished.wait()
+
+    # stops the worker threads, once they're done with the tick they're on
+    def close(self) -> None:
+        if not self.workers:
+            return
+
+        assert self.tick_started is not None
+        workers, self.workers = self.workers, []
+        self.tick_started.wait()
+        for worker in workers:
+            worker.join()
+
+    def process_for_tick(self, tick: int) -> None:
+        every_branch = not self.evaluated_every_branch
+        self.evaluated_every_branch = True
+        self.run_steps(self.shared_steps, tick, every_branch)
+
+        if self.mode == 'measuring' and not every_branch:
+            started_ns = time.perf_counter_ns()
+            run_parallel = self.measured_ticks % 2 == 0
+            self.run_partitions(tick, every_branch, run_parallel)
+            if run_parallel:
+                self.parallel_ns += time.perf_counter_ns() - started_ns
+            else:
+                self.serial_ns += time.perf_counter_ns() - started_ns
+            self.measured_ticks += 1
+            if self.measured_ticks == 2 * self.CALIBRATION_TICKS:
+                self.pick_mode()
+        else:
+            self.run_partitions(tick, every_branch, self.mode != 'serial')
+
+        if self.value_store is not None:
+            self.value_store.capture()
+
+    def run_partitions(self, tick: int, every_branch: bool, run_parallel: bool) -> None:
+        if not run_parallel:
+            for share in self.shares:
+                self.run_steps(share, tick, every_branch)
+            return
+
+        assert self.tick_started is not None and self.tick_finished is not None
+        self.running_tick = tick
+        self.running_every_branch = every_branch
+        self.tick_started.wait()
+        try:
+            self.run_steps(self.shares[0], tick, every_branch)
+        finally:
+            self.tick_finished.wait()
+
+        if self.errors:
+            error = self.errors[0]
+            self.errors.clear()
+            raise error
+
+    def pick_mode(self) -> None:
+        parallel_us = self.parallel_ns / self.CALIBRATION_TICKS / 1000
+        serial_us = self.serial_ns / self.CALIBRATION_TICKS / 1000
+        self.mode = 'parallel' if self.parallel_ns < self.serial_ns else 'serial'
+        logger.info(
+            f"Partitions took {parallel_us:.1f}us/tick on {len(self.shares)} threads and {serial_us:.1f}us/tick on "
+            f"one, running them {'in parallel' if self.mode == 'parallel' else 'serially'} from now on")
+        if self.mode == 'serial':
+            self.close()
+
+
+def partition_size(steps: list[ScheduleStep]) -> int:
+    return sum(len(step_nodes(step)) for step in steps)
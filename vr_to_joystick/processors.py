@@ -0,0 +1,29 @@
+from typing import Any, Callable, Literal, Optional, Protocol
+
+from vr_to_joystick.compiled_processor import CompiledProcessor
+from vr_to_joystick.incremental_processor import IncrementalProcessor
+from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+from vr_to_joystick.parallel_processor import ParallelProcessor
+from vr_to_joystick.scheduled_processor import ScheduledProcessor
+from vr_to_joystick.serial_processor import SerialProcessor
+from vr_to_joystick.value_store import ValueStore
+
+
+class Processor(Protocol):
+    def process_for_tick(self, tick: int) -> None: ...
+
+
+ProcessorName = Literal['serial', 'scheduled', 'incremental', 'compiled', 'parallel']
+
+# each factory takes the graph's root node, its sinks (i.e. the nodes whose values actually leave the graph),
+# and the value store to keep the mapped axis and button values in
+PROCESSORS: dict[
+    ProcessorName,
+    Callable[[ValueGenerator[Any], list[ValueConsumer], Optional[ValueStore]], Processor]
+] = {
+    'serial': lambda root_node, _, value_store: SerialProcessor(root_node, value_store),
+    'scheduled': ScheduledProcessor,
+    'incremental': IncrementalProcessor,
+    'compiled': CompiledProcessor,
+    'parallel': ParallelProcessor,
+}
@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+import logging
+from typing import Any, Optional
+
+from vr_to_joystick.graph import ScheduleStep, dependency_order, lazy_schedule, topological_order
+from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+from vr_to_joystick.value_store import ValueStore
+
+logger = logging.getLogger(__name__)
+
+
+# Sorts the graph once up front, so each tick is a single pass over a flat list with no readiness checks.
+# If sinks (the nodes whose values leave the graph) are given, only nodes that can affect them are scheduled, and
+# nodes that only feed one branch of a switch (see ValueConsumer.branch_dependencies) are only evaluated on ticks
+# that branch is selected. Every node is evaluated on the first tick regardless, so each has a value to report.
+# The schedule is a snapshot of the graph at construction time: call compile() again after binding new nodes.
+# Given a value store, the mapped values are copied into it at the end of every tick.
+@dataclass
+class ScheduledProcessor:
+    root_node: ValueGenerator[Any]
+    sinks: Optional[list[ValueConsumer]] = None
+    value_store: Optional[ValueStore] = None
+    schedule: list[ValueConsumer] = field(init=False)
+    steps: list[ScheduleStep] = field(init=False)
+    pruned_node_count: int = field(init=False)
+    branch_node_count: int = field(init=False)
+    evaluated_every_branch: bool = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.compile()
+
+    def compile(self) -> None:
+        reachable = topological_order(self.root_node)
+        if self.sinks is None:
+            self.schedule = reachable
+            self.steps = [ScheduleStep(node) for node in self.schedule]
+        else:
+            self.schedule = dependency_order(self.sinks)
+            self.steps = lazy_schedule(self.sinks, self.schedule)
+
+        self.pruned_node_count = len(set(reachable) - set(self.schedule))
+        self.branch_node_count = len(self.schedule) - len(self.steps)
+        self.evaluated_every_branch = False
+        logger.info(
+            f"Scheduled {len(self.schedule)} node(s), pruned {self.pruned_node_count} that can't affect any output, "
+            f"{self.branch_node_count} only evaluated when their branch is selected")
+
+    def process_for_tick(self, tick: int) -> None:
+        self.run_steps(self.steps, tick, not self.evaluated_every_branch)
+        self.evaluated_every_branch = True
+
+        if self.value_store is not None:
+            self.value_store.capture()
+
+    @classmethod
+    def run_steps(cls, steps: list[ScheduleStep], tick: int, every_branch: bool = False) -> None:
+        for step in steps:
+            node = step.node
+            if step.branches:
+                inputs = {
+                    key: dependency.current_value
+                    for key, dependency in node.dependencies.items()
+                    if key not in node.branch_dependencies
+                }
+                for key, branch in step.branches.items():
+                    if branch and (every_branch or node.branch_selected(key, inputs)):
+                        cls.run_steps(branch, tick, every_branch)
+
+            node.update(tick)
@@ -1,13 +1,15 @@
 from collections import deque
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Optional
 
 from vr_to_joystick.nodes.value_generator import ValueConsumer, ValueGenerator
+from vr_to_joystick.value_store import ValueStore
 
 
 @dataclass
 class SerialProcessor:
     root_node: ValueGenerator[Any]
+    value_store: Optional[ValueStore] = None
 
     def process_for_tick(self, tick: int) -> None:
         nodes_to_analyze = deque[ValueConsumer]()
@@ -15,9 +17,13 @@ class SerialProcessor:
 
         while len(nodes_to_analyze) > 0:
             node = nodes_to_analyze.popleft()
-            if node.dependencies_updated_for_tick(tick):
+            # children are queued once per parent, so skip any that an earlier visit this tick already updated
+            if not node.updated_for_tick(tick) and node.dependencies_updated_for_tick(tick):
                 node.update(tick)
 
                 if isinstance(node, ValueGenerator):
                     for child in node.bound_children:
                         nodes_to_analyze.append(child)
+
+        if self.value_store is not None:
+            self.value_store.capture()
@@ -0,0 +1,374 @@
+import ctypes
+import logging
+from multiprocessing import resource_tracker, shared_memory
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import openvr
+
+from vr_to_joystick.fake_vr_system import FakeVrSystem
+from vr_to_joystick.nodes.vr_system_state import DEVICE_EVENTS
+from vr_to_joystick.tick_scheduler import TickScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAME = 'vr_to_joystick'
+MAX_DEVICES = openvr.k_unMaxTrackedDeviceCount
+# snapshots are written round a ring of this many, so a reader copying one has that many polls to finish before the
+# poller comes back round to it
+SNAPSHOT_SLOTS = 4
+EVENT_CAPACITY = 1024
+HAPTIC_PULSE_CAPACITY = 64
+MAX_EVALUATORS = 8
+# how many times a reader tries to copy a consistent snapshot before giving up and keeping the one it has
+MAX_READ_ATTEMPTS = 8
+ATTACH_TIMEOUT = 5
+ATTACH_POLL_TIME = 0.01
+
+
+# Everything a tick reads from openvr as of one poll, laid out the same way in every slot of the ring
+class Snapshot(ctypes.Structure):
+    _fields_ = [
+        ('sequence', ctypes.c_uint64),
+        # time.monotonic() when the poll started
+        ('polled_at', ctypes.c_double),
+        ('device_classes', ctypes.c_int32 * MAX_DEVICES),
+        ('controller_roles', ctypes.c_int32 * MAX_DEVICES),
+        ('has_controller_state', ctypes.c_bool * MAX_DEVICES),
+        ('poses', openvr.TrackedDevicePose_t * MAX_DEVICES),
+        # poses predicted as far ahead as the furthest any evaluator asked for, shared by all of them
+        ('predicted_poses', openvr.TrackedDevicePose_t * MAX_DEVICES),
+        ('controller_states', openvr.VRControllerState_t * MAX_DEVICES),
+    ]
+
+
+# The sequence counter is odd while the poller writes the slot, and goes up by two for every write, so a reader that
+# sees the same even value before and after copying the snapshot knows it didn't change underneath it
+class SnapshotSlot(ctypes.Structure):
+    _fields_ = [
+        ('seqlock', ctypes.c_uint64),
+        ('snapshot', Snapshot),
+    ]
+
+
+class SharedEvent(ctypes.Structure):
+    _fields_ = [
+        ('event_type', ctypes.c_uint32),
+        ('device_index', ctypes.c_uint32),
+        ('button', ctypes.c_uint32),
+        ('age_seconds', ctypes.c_float),
+        ('polled_at', ctypes.c_double),
+    ]
+
+
+class HapticPulse(ctypes.Structure):
+    _fields_ = [
+        ('device_index', ctypes.c_uint32),
+        ('duration_mcs', ctypes.c_uint32),
+    ]
+
+
+# What an evaluator sends back to the poller: how far ahead its last tick wanted poses predicted (0 for not at all),
+# and haptic pulses
+class EvaluatorChannel(ctypes.Structure):
+    _fields_ = [
+        ('prediction_seconds', ctypes.c_double),
+        ('haptic_pulses_written', ctypes.c_uint64),
+        ('haptic_pulses', HapticPulse * HAPTIC_PULSE_CAPACITY),
+    ]
+
+
+# The whole shared memory block. Every ring has a single writer that fills in an entry before moving its counter on
+# past it, and readers that keep their own position and never write to it, so nobody ever waits on a lock. CPython
+# executes the stores in program order, and on x86 the CPU keeps them in that order too, with aligned 8 byte stores
+# never torn, which is what the counters rely on.
+class SharedVrState(ctypes.Structure):
+    _fields_ = [
+        # sequence number of the latest complete snapshot, which is in slot latest % SNAPSHOT_SLOTS
+        ('latest', ctypes.c_uint64),
+        ('events_written', ctypes.c_uint64),
+        ('slots', SnapshotSlot * SNAPSHOT_SLOTS),
+        ('events', SharedEvent * EVENT_CAPACITY),
+        ('evaluators', EvaluatorChannel * MAX_EVALUATORS),
+    ]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # the poller may still be starting up
+    deadline = time.monotonic() + ATTACH_TIMEOUT
+    while True:
+        try:
+            return _open(name)
+        except FileNotFoundError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(ATTACH_POLL_TIME)
+
+
+def _open(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+
+    block = shared_memory.SharedMemory(name)
+    # Before 3.13, attaching registers the block with this process's resource tracker, which unlinks it when the
+    # process exits, taking it away from the poller and any other evaluator. Only the poller that created it should.
+    if sys.platform != 'win32':
+        resource_tracker.unregister(block._name, 'shared_memory')  # type: ignore[attr-defined]
+    return block
+
+
+def _map_state(block: shared_memory.SharedMemory) -> SharedVrState:
+    if block.buf is None:
+        raise ValueError(f"Shared memory '{block.name}' is closed")
+
+    return SharedVrState.from_buffer(block.buf)
+
+
+# Polls openvr (or anything implementing the same subset of IVRSystem, like FakeVrSystem) in a process of its own,
+# and publishes what it reads to shared memory for evaluators to pick up through SharedMemoryVrSystem. Each poll
+# drains the event queue, fetches every device's pose, and fetches the controller state of every connected device,
+# then writes them into the next slot of the snapshot ring. Events are published after the snapshot they came with,
+# so a reader that has seen an event can always find a snapshot at least as new. Device classes and roles are only
+# looked up again when a device event comes in.
+class VrPoller:
+    def __init__(self, vr_system: Any, name: str = DEFAULT_NAME):
+        self.vr_system = vr_system
+        self.shared_memory = shared_memory.SharedMemory(name, create=True, size=ctypes.sizeof(SharedVrState))
+        self.state = _map_state(self.shared_memory)
+        self.snapshot = Snapshot()
+        self.sequence = 0
+        self.devices_changed = True
+        self.event = openvr.VREvent_t()
+        self.haptic_pulses_read = [0] * MAX_EVALUATORS
+        self.scheduler: Optional[TickScheduler] = None
+        logger.info(f"Publishing VR system state to shared memory '{name}'.")
+
+    def poll(self) -> None:
+        snapshot = self.snapshot
+        vr_system = self.vr_system
+        if isinstance(vr_system, FakeVrSystem):
+            # the fake system's script moves it on one tick per poll
+            vr_system.advance()
+
+        polled_at = time.monotonic()
+        events: list[tuple[int, int, int, float]] = []
+        while vr_system.pollNextEvent(self.event):
+            event = self.event
+            events.append((
+                event.eventType, event.trackedDeviceIndex, event.data.controller.button, event.eventAgeSeconds,
+            ))
+            if event.eventType in DEVICE_EVENTS:
+                self.devices_changed = True
+
+        self.sequence += 1
+        snapshot.sequence = self.sequence
+        snapshot.polled_at = polled_at
+        if self.devices_changed:
+            self.devices_changed = False
+            for device_index in range(MAX_DEVICES):
+                snapshot.device_classes[device_index] = vr_system.getTrackedDeviceClass(device_index)
+                snapshot.controller_roles[device_index] = vr_system.getControllerRoleForTrackedDeviceIndex(device_index)
+
+        vr_system.getDeviceToAbsoluteTrackingPose(openvr.TrackingUniverseSeated, 0, snapshot.poses)
+        prediction_seconds = max(channel.prediction_seconds for channel in self.state.evaluators)
+        if prediction_seconds > 0:
+            vr_system.getDeviceToAbsoluteTrackingPose(
+                openvr.TrackingUniverseSeated, prediction_seconds, snapshot.predicted_poses)
+        else:
+            ctypes.memmove(
+                ctypes.addressof(snapshot.predicted_poses), ctypes.addressof(snapshot.poses),
+                ctypes.sizeof(snapshot.poses))
+        for device_index in range(MAX_DEVICES):
+            if snapshot.device_classes[device_index] == openvr.TrackedDeviceClass_Invalid:
+                snapshot.has_controller_state[device_index] = False
+                continue
+
+            has_controller_state, controller_state = vr_system.getControllerState(device_index)
+            snapshot.has_controller_state[device_index] = has_controller_state
+            snapshot.controller_states[device_index] = controller_state
+
+        self._publish_snapshot()
+        self._publish_events(events, polled_at)
+        self._send_haptic_pulses()
+
+    def _publish_snapshot(self) -> None:
+        slot = self.state.slots[self.sequence % SNAPSHOT_SLOTS]
+        seqlock = slot.seqlock
+        slot.seqlock = seqlock + 1
+        ctypes.memmove(ctypes.addressof(slot.snapshot), ctypes.addressof(self.snapshot), ctypes.sizeof(Snapshot))
+        slot.seqlock = seqlock + 2
+        self.state.latest = self.sequence
+
+    def _publish_events(self, events: list[tuple[int, int, int, float]], polled_at: float) -> None:
+        events_written = self.state.events_written
+        for event_type, device_index, button, age_seconds in events:
+            shared_event = self.state.events[events_written % EVENT_CAPACITY]
+            shared_event.event_type = event_type
+            shared_event.device_index = device_index
+            shared_event.button = button
+            shared_event.age_seconds = age_seconds
+            shared_event.polled_at = polled_at
+            events_written += 1
+        self.state.events_written = events_written
+
+    def _send_haptic_pulses(self) -> None:
+        for evaluator, channel in enumerate(self.state.evaluators):
+            pulses_written = channel.haptic_pulses_written
+            for pulse_index in range(max(self.haptic_pulses_read[evaluator], pulses_written - HAPTIC_PULSE_CAPACITY),
+                                     pulses_written):
+                pulse = channel.haptic_pulses[pulse_index % HAPTIC_PULSE_CAPACITY]
+                self.vr_system.triggerHapticPulse(pulse.device_index, 0, pulse.duration_mcs)
+            self.haptic_pulses_read[evaluator] = pulses_written
+
+    # polls at a fixed rate until ticks polls have run or stop is called, or forever if neither happens
+    def run(self, rate: float, polls: Optional[int] = None) -> None:
+        self.scheduler = TickScheduler(rate)
+        self.scheduler.run(self.poll, polls)
+
+    def stop(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.stop()
+
+    def close(self) -> None:
+        del self.state
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+
+# Entry point for a poller process. The VR system is built in the process by make_vr_system, since neither an openvr
+# session nor a scripted fake can be handed over from another process.
+def run_poller(make_vr_system: Callable[[], Any], name: str, rate: float, polls: Optional[int] = None) -> None:
+    poller = VrPoller(make_vr_system(), name)
+    try:
+        poller.run(rate, polls)
+    finally:
+        poller.close()
+
+
+# Stand-in for openvr.IVRSystem in an evaluator process, answering the subset of its interface this package uses from
+# the snapshots a VrPoller publishes. Draining the event queue copies the latest snapshot, which is what the rest of
+# the tick reads, so VrSystemState, which drains events at the start of every tick, sees a single consistent poll
+# per tick. Poses are always in the seated universe, whatever origin is asked for.
+#
+# Each evaluator attached to the same poller needs its own evaluator number, which its haptic pulses and prediction
+# horizon are sent back through. The poller only publishes one set of predicted poses, predicted as far ahead as the
+# furthest any evaluator asked for, so evaluators predicting different horizons all get the furthest one. The
+# horizon sent back is whatever the evaluator's last tick asked for, so it drops back when the evaluator stops
+# predicting, a tick later.
+class SharedMemoryVrSystem:
+    def __init__(self, name: str = DEFAULT_NAME, evaluator: int = 0):
+        if not 0 <= evaluator < MAX_EVALUATORS:
+            raise ValueError(f"Evaluators are numbered 0 to {MAX_EVALUATORS - 1}, got {evaluator}")
+
+        self.shared_memory = _attach(name)
+        self.state = _map_state(self.shared_memory)
+        self.channel = self.state.evaluators[evaluator]
+        # the snapshot the current tick reads, and the one the next is copied into, so a copy that turns out to have
+        # been overwritten halfway never replaces a good one
+        self.snapshot = Snapshot()
+        self.next_snapshot = Snapshot()
+        # events from before attaching are left alone, since the first snapshot already reflects them
+        self.events_read = self.state.events_written
+        # the furthest ahead predicted poses have been asked for since the event queue was last drained
+        self.requested_prediction_seconds = 0.0
+        # held while a haptic pulse is written, since nodes triggering them can run on several threads at once, e.g.
+        # under ParallelProcessor, and two writes into the same slot would lose one of the pulses
+        self.haptic_pulse_lock = threading.Lock()
+        self.snapshots_read = 0
+        self.stale_reads = 0
+        self.events_lost = 0
+        deadline = time.monotonic() + ATTACH_TIMEOUT
+        while not self.read_snapshot():
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"No VR system state published to '{name}' within {ATTACH_TIMEOUT} seconds")
+            time.sleep(ATTACH_POLL_TIME)
+
+    # Copies the latest snapshot, unless the poller overwrote it while it was being copied every time, in which case the
+    # last one copied is kept. Returns whether there was a snapshot to copy.
+    def read_snapshot(self) -> bool:
+        for _ in range(MAX_READ_ATTEMPTS):
+            latest = self.state.latest
+            if latest == 0:
+                return False
+
+            slot = self.state.slots[latest % SNAPSHOT_SLOTS]
+            seqlock = slot.seqlock
+            if seqlock & 1:
+                continue
+            ctypes.memmove(
+                ctypes.addressof(self.next_snapshot), ctypes.addressof(slot.snapshot), ctypes.sizeof(Snapshot))
+            if slot.seqlock == seqlock:
+                self.snapshot, self.next_snapshot = self.next_snapshot, self.snapshot
+                self.snapshots_read += 1
+                return True
+
+        self.stale_reads += 1
+        return bool(self.snapshot.sequence != 0)
+
+    def close(self) -> None:
+        del self.channel
+        del self.state
+        self.shared_memory.close()
+
+    # the IVRSystem interface
+
+    def getTrackedDeviceClass(self, device_index: int) -> int:
+        return int(self.snapshot.device_classes[device_index])
+
+    def getControllerRoleForTrackedDeviceIndex(self, device_index: int) -> int:
+        return int(self.snapshot.controller_roles[device_index])
+
+    def getDeviceToAbsoluteTrackingPose(self, origin: int, predicted_seconds: float, poses: Any) -> Any:
+        source = self.snapshot.poses
+        if predicted_seconds > 0:
+            self.requested_prediction_seconds = max(self.requested_prediction_seconds, predicted_seconds)
+            source = self.snapshot.predicted_poses
+        ctypes.memmove(
+            ctypes.addressof(poses), ctypes.addressof(source), min(ctypes.sizeof(poses), ctypes.sizeof(source)))
+
+        return poses
+
+    def getControllerState(self, device_index: int) -> tuple[bool, openvr.VRControllerState_t]:
+        controller_state = openvr.VRControllerState_t()
+        ctypes.memmove(
+            ctypes.addressof(controller_state), ctypes.addressof(self.snapshot.controller_states[device_index]),
+            ctypes.sizeof(controller_state))
+        return bool(self.snapshot.has_controller_state[device_index]), controller_state
+
+    def pollNextEvent(self, event: openvr.VREvent_t) -> bool:
+        events_written = self.state.events_written
+        if events_written - self.events_read > EVENT_CAPACITY:
+            # fell so far behind that the events we hadn't read yet were overwritten, so report a device change to
+            # have devices looked up again, which covers any that came or went in the events lost
+            self.events_lost += events_written - EVENT_CAPACITY - self.events_read
+            self.events_read = events_written - EVENT_CAPACITY
+            logger.warning("Lost VR events published while this evaluator was busy.")
+            event.eventType = openvr.VREvent_TrackedDeviceActivated
+            event.trackedDeviceIndex = 0
+            return True
+
+        if self.events_read == events_written:
+            # Draining the queue starts each tick (or probe between ticks), so the last one's horizon is sent back
+            # here, and always sent, so it also resets to 0 once nothing asks for predicted poses any more
+            self.channel.prediction_seconds = self.requested_prediction_seconds
+            self.requested_prediction_seconds = 0.0
+            self.read_snapshot()
+            return False
+
+        shared_event = self.state.events[self.events_read % EVENT_CAPACITY]
+        event.eventType = shared_event.event_type
+        event.trackedDeviceIndex = shared_event.device_index
+        event.data.controller.button = shared_event.button
+        event.eventAgeSeconds = shared_event.age_seconds + time.monotonic() - shared_event.polled_at
+        self.events_read += 1
+        return True
+
+    def triggerHapticPulse(self, device_index: int, axis_id: int, duration_mcs: int) -> None:
+        with self.haptic_pulse_lock:
+            pulses_written = self.channel.haptic_pulses_written
+            pulse = self.channel.haptic_pulses[pulses_written % HAPTIC_PULSE_CAPACITY]
+            pulse.device_index = device_index
+            pulse.duration_mcs = duration_mcs
+            self.channel.haptic_pulses_written = pulses_written + 1
@@ -0,0 +1,208 @@
+from dataclasses import dataclass, field
+import math
+import time
+from typing import Callable, Literal, Optional, Protocol
+
+# What to do about deadlines that passed while a tick was still running: skip them and wait for the next one, or run
+# the missed ticks back to back until caught up
+OverrunPolicy = Literal['skip', 'catch_up']
+
+NANOSECONDS_PER_SECOND = 1_000_000_000
+
+
+# Tells the scheduler whether the mapping's inputs are changing. is_active is checked after each tick, and probe is
+# called between ticks while idle, to check fresh inputs without running a whole tick.
+class ActivitySource(Protocol):
+    def is_active(self) -> bool:
+        ...
+
+    def probe(self) -> bool:
+        ...
+
+
+# How late each tick started relative to its deadline, and how many deadlines were missed. Lateness is accumulated as
+# running sums, so recording a tick doesn't allocate. Swap in a fresh instance to start a new reporting window.
+@dataclass
+class TickStats:
+    ticks: int = 0
+    overruns: int = 0
+    skipped_ticks: int = 0
+    lateness_sum_ns: int = 0
+    lateness_squared_sum_ns: int = 0
+    max_lateness_ns: int = 0
+    started_ns: int = 0
+    last_tick_ns: int = 0
+    # ticks run while idle, deadlines where inputs were only probed, and the time spent idle
+    idle_ticks: int = 0
+    probes: int = 0
+    idle_ns: int = 0
+
+    def record(self, deadline_ns: int, started_ns: int) -> None:
+        lateness_ns = started_ns - deadline_ns
+        if self.ticks == 0:
+            self.started_ns = started_ns
+        self.ticks += 1
+        self.last_tick_ns = started_ns
+        self.lateness_sum_ns += lateness_ns
+        self.lateness_squared_sum_ns += lateness_ns * lateness_ns
+        self.max_lateness_ns = max(self.max_lateness_ns, lateness_ns)
+
+    @property
+    def mean_lateness_us(self) -> float:
+        return self.lateness_sum_ns / max(self.ticks, 1) / 1000
+
+    # standard deviation of the lateness, i.e. how much tick start times wander around their deadlines
+    @property
+    def jitter_us(self) -> float:
+        if self.ticks < 2:
+            return 0.0
+
+        mean = self.lateness_sum_ns / self.ticks
+        variance = max(self.lateness_squared_sum_ns / self.ticks - mean * mean, 0.0)
+        return math.sqrt(variance) / 1000
+
+    # ticks per second actually achieved, measured between the first and last tick started
+    @property
+    def effective_rate(self) -> float:
+        if self.ticks < 2:
+            return 0.0
+
+        return (self.ticks - 1) * NANOSECONDS_PER_SECOND / (self.last_tick_ns - self.started_ns)
+
+    # share of the time between the first and last tick spent idle
+    @property
+    def idle_fraction(self) -> float:
+        if self.last_tick_ns <= self.started_ns:
+            return 0.0
+
+        return min(self.idle_ns / (self.last_tick_ns - self.started_ns), 1.0)
+
+    def summary(self) -> str:
+        summary = (
+            f"{self.effective_rate:.2f} ticks/s, "
+            f"lateness mean {self.mean_lateness_us:.0f}us / max {self.max_lateness_ns / 1000:.0f}us, "
+            f"jitter {self.jitter_us:.0f}us, "
+            f"{self.overruns} overrun(s), {self.skipped_ticks} tick(s) skipped"
+        )
+        if self.idle_ns:
+            summary += (
+                f", idle {self.idle_fraction:.0%} of the time "
+                f"({self.idle_ticks} idle tick(s), {self.probes} probe(s))"
+            )
+        return summary
+
+
+# Runs a tick function at a fixed rate against absolute deadlines on the perf_counter_ns clock, so time lost to
+# sleeping too long or to a slow tick never carries over into the ticks after it. Sleeping stops spin_ns short of each
+# deadline, and the rest is spent spinning on the clock, since sleeps routinely overshoot by a millisecond or more.
+# A spin_ns of 0 turns the spinning off and just sleeps.
+#
+# With an idle_rate, ticks are run at that rate instead once inputs have rested for idle_after_seconds, as reported by
+# the activity source passed to run. The deadlines in between still come at the full rate, but just probe for
+# activity, with no spinning since being a little late to a probe doesn't matter, and any activity found runs a tick
+# there and then and goes back to the full rate.
+@dataclass
+class TickScheduler:
+    rate: float
+    overrun_policy: OverrunPolicy = 'skip'
+    spin_ns: int = 500_000
+    # with the catch_up policy, missed ticks beyond this many are skipped anyway, so one long stall can't turn into a
+    # burst of stale ticks
+    max_catch_up_ticks: int = 10
+    idle_rate: Optional[float] = None
+    idle_after_seconds: float = 1.0
+    clock: Callable[[], int] = time.perf_counter_ns
+    sleep: Callable[[float], None] = time.sleep
+    stats: TickStats = field(default_factory=TickStats)
+    period_ns: int = field(init=False)
+    # full-rate deadlines per tick while idle, and how many ticks in a row without activity count as resting
+    idle_tick_interval: int = field(init=False)
+    idle_after_ticks: int = field(init=False)
+    running: bool = field(default=False, init=False)
+
+    def __post_init__(self) -> None:
+        if self.rate <= 0:
+            raise ValueError(f"Tick rate must be positive, got {self.rate}")
+
+        self.period_ns = round(NANOSECONDS_PER_SECOND / self.rate)
+        if self.idle_rate is None:
+            self.idle_tick_interval = 1
+        elif 0 < self.idle_rate <= self.rate:
+            self.idle_tick_interval = max(round(self.rate / self.idle_rate), 1)
+        else:
+            raise ValueError(f"Idle tick rate must be positive and at most the tick rate, got {self.idle_rate}")
+        self.idle_after_ticks = max(round(self.idle_after_seconds * self.rate), 1)
+
+    def wait_until(self, deadline_ns: int, spin: bool = True) -> None:
+        spin_ns = self.spin_ns if spin else 0
+        remaining_ns = deadline_ns - self.clock()
+        if remaining_ns > spin_ns:
+            self.sleep((remaining_ns - spin_ns) / NANOSECONDS_PER_SECOND)
+        while self.clock() < deadline_ns:
+            pass
+
+    # Works out the deadline after one the tick just run was due at, given the time it finished, recording any
+    # deadlines that have already gone by
+    def next_deadline(self, deadline_ns: int, now_ns: int) -> int:
+        deadline_ns += self.period_ns
+        if now_ns <= deadline_ns:
+            return deadline_ns
+
+        self.stats.overruns += 1
+        # deadlines that have passed, including this one
+        missed = (now_ns - deadline_ns) // self.period_ns + 1
+        if self.overrun_policy == 'catch_up':
+            skipped = max(missed - self.max_catch_up_ticks, 0)
+        else:
+            # the next tick starts on the first deadline still ahead
+            skipped = missed
+
+        self.stats.skipped_ticks += skipped
+        return deadline_ns + skipped * self.period_ns
+
+    # Calls tick once per period until ticks have run or stop is called, or forever if neither happens. Ticks only
+    # slow down when idle if there's both an idle_rate and an activity source.
+    def run(
+            self,
+            tick: Callable[[], None],
+            ticks: Optional[int] = None,
+            activity: Optional[ActivitySource] = None) -> None:
+        deadline_ns = self.clock()
+        ticks_run = 0
+        resting_ticks = 0
+        idle = False
+        deadlines_since_tick = 0
+        self.running = True
+        while self.running and (ticks is None or ticks_run < ticks):
+            if idle:
+                self.stats.idle_ns += self.period_ns
+                deadlines_since_tick += 1
+                if deadlines_since_tick < self.idle_tick_interval:
+                    self.wait_until(deadline_ns, spin=False)
+                    self.stats.probes += 1
+                    if activity is not None and not activity.probe():
+                        deadline_ns = self.next_deadline(deadline_ns, self.clock())
+                        continue
+
+                    idle = False
+                    resting_ticks = 0
+                else:
+                    self.stats.idle_ticks += 1
+
+            self.wait_until(deadline_ns)
+            self.stats.record(deadline_ns, self.clock())
+            tick()
+            ticks_run += 1
+            deadlines_since_tick = 0
+            if self.idle_rate is not None and activity is not None:
+                if activity.is_active():
+                    idle = False
+                    resting_ticks = 0
+                else:
+                    resting_ticks += 1
+                    idle = resting_ticks >= self.idle_after_ticks
+            deadline_ns = self.next_deadline(deadline_ns, self.clock())
+
+    # makes run return before its next deadline, e.g. when called from a tick
+    def stop(self) -> None:
+        self.running = False
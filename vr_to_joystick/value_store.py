@@ -0,0 +1,38 @@
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from vr_to_joystick.nodes.types import TICK_STATE_CODES, Axis, Button
+
+
+# Flat, preallocated buffers holding the latest value of every mapped axis and button, addressed by integer slot.
+# Axes are doubles; buttons are tick state codes (see TICK_STATE_CODES), so a button is active when its low bit is set.
+# Processors either write straight into the buffers, or call capture() once a tick to copy the nodes' values in.
+@dataclass
+class ValueStore:
+    axis_nodes: list[Axis]
+    button_nodes: list[Button]
+    axes: 'array[float]' = field(init=False)
+    buttons: bytearray = field(init=False)
+    axis_slots: dict[Axis, int] = field(init=False)
+    button_slots: dict[Button, int] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.axes = array('d', [0.0] * len(self.axis_nodes))
+        self.buttons = bytearray(len(self.button_nodes))
+        self.axis_slots = {node: slot for slot, node in enumerate(self.axis_nodes)}
+        self.button_slots = {node: slot for slot, node in enumerate(self.button_nodes)}
+
+    # a store with one slot per distinct node, so a node mapped to several outputs is only stored once
+    @classmethod
+    def for_nodes(cls, axis_nodes: Iterable[Axis], button_nodes: Iterable[Button]) -> 'ValueStore':
+        return cls(list(dict.fromkeys(axis_nodes)), list(dict.fromkeys(button_nodes)))
+
+    def capture(self) -> None:
+        axes = self.axes
+        for slot, axis_node in enumerate(self.axis_nodes):
+            axes[slot] = axis_node.current_value
+
+        buttons = self.buttons
+        for slot, button_node in enumerate(self.button_nodes):
+            buttons[slot] = TICK_STATE_CODES[button_node.current_value['tick_state']]